@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+'''benchmark the Shelly1 client against a local pyshelly.mock.MockShelly1
+
+usage: python benchmarks/bench_shelly1.py [--latency 0.005] [--jitter 0.002] [--requests 500]
+
+Reports calls/sec and p50/p99 latency of status, power and toggle, and the edge lateness of
+the oscillate family, so regressions show up without hardware.
+'''
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pyshelly import Shelly1
+from pyshelly.mock import MockShelly1
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+
+
+def report(name, samples, elapsed):
+    print(f"{name:<20} {len(samples) / elapsed:>10.1f} calls/s   p50 {percentile(samples, 50) * 1000:>7.2f} ms"
+          f"   p99 {percentile(samples, 99) * 1000:>7.2f} ms")
+
+
+def bench_calls(name, call, requests):
+    samples = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        t = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - t)
+    report(name, samples, time.perf_counter() - start)
+
+
+def bench_oscillation(name, run):
+    start = time.perf_counter()
+    o = run()
+    elapsed = time.perf_counter() - start
+    lateness = [abs(l) for l in o.lateness]
+    t = o.telemetry()
+    print(f"{name:<20} {o.count:>6} edges in {elapsed:6.2f} s   |lateness| p50 "
+          f"{percentile(lateness, 50) * 1000:>7.2f} ms   p99 {percentile(lateness, 99) * 1000:>7.2f} ms"
+          f"   late {t['late']}   missed {t['missed']}   {t['achieved_frequency']:.2f}/{t['frequency']:.2f} Hz")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.005, help="mock processing time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.002, help="mock latency jitter in seconds")
+    parser.add_argument("--requests", type=int, default=500, help="requests per call benchmark")
+    parser.add_argument("--period", type=float, default=0.05, help="oscillation period in seconds")
+    parser.add_argument("--cycles", type=int, default=20, help="oscillation cycles")
+    args = parser.parse_args()
+
+    with MockShelly1(latency=args.latency, jitter=args.jitter, seed=1) as mock, Shelly1(mock.host) as s:
+        print(f"mock latency {args.latency * 1000:.1f} ms +- {args.jitter * 1000:.1f} ms")
+
+        bench_calls("status", s.status, args.requests)
+        bench_calls("get_relay_state", lambda: s.get_relay_state(0), args.requests)
+        bench_calls("power", lambda: s.power(0, True), args.requests)
+        bench_calls("toggle", lambda: s.toggle(0), args.requests)
+        bench_calls("toggle (2-step)", lambda: s.toggle(0, native=False), args.requests)
+
+        bench_oscillation("oscillate_cycles", lambda: s.oscillate_cycles(0, args.period, args.cycles))
+        bench_oscillation("oscillate_timeout", lambda: s.oscillate_timeout(0, args.period, 1))
+
+        def _oscillate():
+            run = s.oscillate(0, args.period, block=False)
+            time.sleep(args.period * args.cycles * 2)
+            run.cancel()
+            run.join()
+            return run
+
+        bench_oscillation("oscillate", _oscillate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+'''hammer one shared Shelly1 from many threads against a local pyshelly.mock.MockShelly1
+
+usage: python benchmarks/stress_shelly1.py [--threads 16] [--rounds 20] [--max-requests 2]
+
+Checks the invariants of sharing a Shelly1 between threads and exits non-zero if one breaks:
+only one of many simultaneous oscillations starts, the edge counter matches the edges run,
+no toggle is lost, and the cached status never goes backwards.
+'''
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pyshelly import RelayState, Shelly1
+from pyshelly.mock import MockShelly1
+
+
+def hammer(threads, target):
+    '''run target(i) on threads threads released at the same time
+
+    returns: list of results or exceptions, by thread
+    '''
+    barrier = threading.Barrier(threads)
+    results = [None] * threads
+
+    def _run(i):
+        barrier.wait()
+        try:
+            results[i] = target(i)
+        except Exception as e:
+            results[i] = e
+
+    workers = [threading.Thread(target=_run, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return results
+
+
+def check(name, ok, detail=""):
+    print(f"{'ok' if ok else 'FAIL':<5} {name}{'   ' + detail if detail else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16, help="threads sharing the Shelly1")
+    parser.add_argument("--rounds", type=int, default=20, help="rounds of simultaneous oscillations")
+    parser.add_argument("--toggles", type=int, default=25, help="toggles per thread")
+    parser.add_argument("--max-requests", type=int, default=2, help="Shelly1 max_requests, 0 for none")
+    args = parser.parse_args()
+
+    ok = True
+    with MockShelly1(relays=2, latency=0.001) as mock, \
+            Shelly1(mock.host, status_ttl=0.01, max_requests=args.max_requests or None) as s:
+
+        # Re-entry: of many oscillations started at once, exactly one runs
+        duplicates = 0
+        counts = []
+        for _ in range(args.rounds):
+            results = hammer(args.threads, lambda i: s.oscillate_cycles(0, 0.05, 2, block=False))
+            started = [r for r in results if not isinstance(r, Exception)]
+            duplicates = duplicates + len(started) - 1
+            for run in started:
+                run.join()
+            counts.append((s._oscillations, started[0].count / 2 if started else None))
+        ok &= check("one oscillation per round", duplicates == 0, f"{duplicates} duplicates")
+        ok &= check("edge counter", all(c == e for c, e in counts), f"{counts[:3]}...")
+
+        # Lost updates: every toggle reaches the module, the relay ends in the parity state
+        initial = s.get_relay_state(1)
+        before = mock.requests.get("/relay/1", 0)
+        hammer(args.threads, lambda i: [s.toggle(1) for _ in range(args.toggles)])
+        toggles = args.threads * args.toggles
+        sent = mock.requests.get("/relay/1", 0) - before
+        expected = initial if toggles % 2 == 0 else \
+            (RelayState.OFF if initial == RelayState.ON else RelayState.ON)
+        ok &= check("no lost toggles", sent == toggles, f"{sent}/{toggles} requests")
+        ok &= check("final relay state", s.get_relay_state(1) == expected)
+
+        # The status cache is never rolled back to a response older than a write; one writer,
+        # every other thread reading
+        stale = []
+        def _mixed(i):
+            for n in range(args.toggles):
+                if i == 0:
+                    state = s.power(1, bool(n % 2))
+                    cached = s._fresh_status()
+                    if cached and cached['relays'][1]['ison'] != state.value:
+                        stale.append(n)
+                else:
+                    s.status()
+        start = time.perf_counter()
+        hammer(args.threads, _mixed)
+        ok &= check("status cache", not stale, f"{time.perf_counter() - start:.2f} s")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,36 @@
-from .shelly import RelayState, Shelly1
+from .models import DeviceInfo, Meter, Relay, RelayState, Status, Wifi
+from .shelly import Shelly1
+from .transport import DeadlineExceeded, HTTPClientTransport, HTTPStatusError, RequestsTransport, Timeout, \
+    Transport, TransportConnectError, TransportError, TransportTimeout
+from .oscillation import Oscillation
+from .scheduler import Scheduler
+from .mirror import StateMirror
+from .metrics import Metrics
+from .decoding import SelectiveDecoder
+from .commands import CommandQueue
+from .retry import RetryPolicy
+from .breaker import CircuitBreaker, CircuitOpenError
+from .poller import AdaptivePoller
+
+# Imported on first use, they pull in asyncio, http.server or concurrent thread pools which
+# short-lived programs using a single Shelly1 do not need
+_LAZY = {
+    "AsyncShelly1": "aio",
+    "AsyncTransport": "aio",
+    "ShellyFleet": "fleet",
+    "CoIoTListener": "coiot",
+    "ActionReceiver": "webhook",
+    "discover": "discovery",
+    "DeviceRegistry": "registry",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        return getattr(importlib.import_module(f".{_LAZY[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
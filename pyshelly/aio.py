@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+
+import asyncio
+import time
+
+from urllib.parse import urlsplit
+
+from .decoding import SelectiveDecoder, default_decoder
+from .models import RelayState, Status
+from .oscillation import Oscillation
+from .transport import DeadlineExceeded, HTTPStatusError, Timeout, TransportConnectError, TransportError, \
+    TransportTimeout, writes
+
+
+class AsyncTransport():
+    def __init__(self, limit_per_host=2, decoder=None):
+        '''non-blocking keep-alive HTTP/1.1 transport built on asyncio streams
+
+        limit_per_host - maximum number of connections opened to a single host
+        decoder - callable decoding response bodies - if not set, the fastest JSON library
+                  installed (see pyshelly.decoding.default_decoder)
+
+        Like pyshelly.transport.Transport, it may be shared by any number of shelly objects.
+        '''
+        assert type(limit_per_host) == int
+        assert limit_per_host > 0
+
+        self.limit_per_host = limit_per_host
+        self.decoder = decoder or default_decoder()
+
+        # (host, port) -> list of idle (reader, writer) pairs
+        self._idle = {}
+
+        # (host, port) -> asyncio.Semaphore bounding connections to that host
+        self._semaphores = {}
+
+        self._closed = False
+
+    def decode(self, body, decoder=None):
+        '''decode a response body
+
+        decoder: callable to decode body with instead of self.decoder
+
+        returns: decoded JSON
+        '''
+        return (decoder or self.decoder)(body)
+
+    async def get_json(self, url, timeout, decoder=None, deadline=None):
+        '''issue a GET request and decode the JSON response
+
+        decoder: callable to decode the response with instead of self.decoder
+        deadline: monotonic time the request must be done by, see get()
+
+        returns: decoded JSON
+        '''
+        return self.decode(await self.get(url, timeout, deadline), decoder)
+
+    async def get(self, url, timeout, deadline=None):
+        '''issue a GET request
+
+        url: absolute http url of the request
+        timeout: amount of time in seconds the request will wait to get a response, or
+                 separate connect and read timeouts as a tuple or pyshelly.transport.Timeout -
+                 the read timeout then bounds the whole response
+        deadline: monotonic time the whole request must be done by - if not set, only timeout
+                  bounds it
+
+        returns: the response body as bytes
+
+        raises: pyshelly.transport.DeadlineExceeded once the deadline has passed
+        '''
+        if deadline is None:
+            return await self._get(url, timeout)
+
+        try:
+            return await asyncio.wait_for(self._get(url, timeout), max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(f"{url}: deadline exceeded") from e
+
+    async def _get(self, url, timeout):
+        if self._closed:
+            raise TransportError('transport is closed')
+
+        u = urlsplit(url)
+        key = (u.hostname, u.port or 80)
+        target = u.path or "/"
+        if u.query:
+            target = target + "?" + u.query
+        request = (f"GET {target} HTTP/1.1\r\nHost: {u.netloc}\r\nAccept: application/json\r\n"
+                   "Connection: keep-alive\r\n\r\n").encode()
+
+        sem = self._semaphores.get(key)
+        if sem is None:
+            sem = self._semaphores[key] = asyncio.Semaphore(self.limit_per_host)
+
+        timeout = Timeout.of(timeout)
+        async with sem:
+            try:
+                status, body = await self._request(key, request, timeout, writes(target))
+            except TransportConnectError as e:
+                raise TransportConnectError(f"{url}: {e}") from e.__cause__
+            except asyncio.TimeoutError as e:
+                raise TransportTimeout(f"{url} timed out after {timeout.read} seconds") from e
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                raise TransportError(f"{url}: {e}") from e
+
+        if status >= 400:
+            raise HTTPStatusError(url, status)
+
+        return body
+
+    async def _request(self, key, request, timeout, write):
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            reader, writer = idle.pop()
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+
+            try:
+                writer.write(request)
+                await asyncio.wait_for(writer.drain(), timeout.read)
+            except OSError:
+                # the module dropped an idle keep-alive connection before the request went out
+                writer.close()
+                continue
+            except BaseException:
+                writer.close()
+                raise
+
+            try:
+                return await asyncio.wait_for(self._response(key, reader, writer), timeout.read)
+            except (OSError, asyncio.IncompleteReadError):
+                # the module dropped the connection, maybe after acting on the request - only a
+                # request without effects is sent again, a write fails and is left to the caller
+                if write:
+                    raise
+
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(key[0], key[1]), timeout.connect)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise TransportConnectError(str(e) or "connect timed out") from e
+        return await asyncio.wait_for(self._roundtrip(key, reader, writer, request), timeout.read)
+
+    async def _roundtrip(self, key, reader, writer, request):
+        try:
+            writer.write(request)
+            await writer.drain()
+        except BaseException:
+            writer.close()
+            raise
+        return await self._response(key, reader, writer)
+
+    async def _response(self, key, reader, writer):
+        try:
+            version, status, _ = (await reader.readuntil(b"\r\n")).decode("latin-1").split(" ", 2)
+            status = int(status)
+
+            headers = {}
+            while True:
+                line = await reader.readuntil(b"\r\n")
+                if line == b"\r\n":
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                chunks = []
+                while True:
+                    size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                    if size == 0:
+                        # discard trailers
+                        while await reader.readuntil(b"\r\n") != b"\r\n":
+                            pass
+                        break
+                    chunks.append(await reader.readexactly(size))
+                    await reader.readexactly(2)
+                body = b"".join(chunks)
+            elif "content-length" in headers:
+                body = await reader.readexactly(int(headers["content-length"]))
+            else:
+                body = await reader.read()
+                keep_alive = False
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive and not self._closed:
+            self._idle.setdefault(key, []).append((reader, writer))
+        else:
+            writer.close()
+
+        return status, body
+
+    async def close(self):
+        '''close all idle connections held by the transport'''
+        self._closed = True
+        idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for _, writer in conns:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class AsyncShelly1():
+    def __init__(self, host=None, http_timeout=1, transport=None, native_toggle=True, metrics=None,
+                 status_fields=None):
+        '''asyncio shellyone module, mirrors pyshelly.Shelly1 with awaitable methods
+
+        host - the hostname or IP address of the module - if not set, will default to 192.168.33.1
+        http_timeout - amount of time in seconds an http request will wait to get a response, or
+                       separate connect and read timeouts as a tuple or pyshelly.transport.Timeout
+        transport - a pyshelly.aio.AsyncTransport to issue requests with - if not set, one is
+                    created and owned (closed by close()) by this object. A transport passed in
+                    may be shared by several objects and is not closed.
+        native_toggle - toggle relays with the firmware's turn=toggle in one request - set to False for
+                        firmware lacking it to read the state and then set the opposite one
+        metrics - a pyshelly.metrics.Metrics recording every request, may be shared
+        status_fields - paths of the only fields status() decodes, e.g. ("wifi_sta.rssi",) -
+                        see pyshelly.decoding.SelectiveDecoder. The relay states relay reads use,
+                        relays[*].ison, are always decoded. If not set, the whole response.
+        '''
+        if host:
+            self.host = host
+        else:
+            self.host = "192.168.33.1"
+
+        self.http_timeout = http_timeout
+
+        self.shelly_base_url = f"http://{self.host}"
+
+        self.native_toggle = native_toggle
+
+        self.metrics = metrics
+
+        self._status_decoder = SelectiveDecoder(*status_fields, "relays[*].ison") if status_fields else None
+
+        if transport:
+            self.transport = transport
+            self._owns_transport = False
+        else:
+            self.transport = AsyncTransport()
+            self._owns_transport = True
+
+        # Initialize an oscillation task
+        self._oscillation_task = None
+
+        # Initialize oscillation stop event, created for each run inside the event loop
+        self._stop_oscillation = None
+
+        # Initialize an oscillation counter
+        self._oscillations = 0
+
+        # Timing of the current or last oscillation run (pyshelly.oscillation.Oscillation)
+        self.oscillation = None
+
+    async def close(self):
+        '''close the transport if it is owned by this object'''
+        if self._owns_transport:
+            await self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _get(self, path, decoder=None):
+        if self.metrics is None:
+            return await self.transport.get_json(self.shelly_base_url + path, self.http_timeout, decoder)
+
+        start = time.perf_counter()
+        body = None
+        try:
+            body = await self.transport.get(self.shelly_base_url + path, self.http_timeout)
+            data = self.transport.decode(body, decoder)
+        except Exception as e:
+            self.metrics.record(self.host, path, time.perf_counter() - start, len(body or b""), e)
+            raise
+        self.metrics.record(self.host, path, time.perf_counter() - start, len(body))
+        return data
+
+    async def status(self, parsed=False):
+        '''get the status of the shelly
+
+        parsed: return a compact pyshelly.models.Status instead of the JSON
+
+        returns: module status as JSON, or pyshelly.models.Status if parsed
+        '''
+        status = await self._get("/status", self._status_decoder)
+        return Status(status) if parsed else status
+
+    async def get_relays(self):
+        '''get a list of relays supported by the module
+
+        returns: list of tuples - (id, shelly.RelayState)
+        '''
+        return [(r.id, r.state) for r in (await self.status(parsed=True)).relays]
+
+    async def get_relay_state(self, relay_id):
+        '''get the status of a relay by id
+
+        relay_id: integer id of the relay
+
+        returns: shelly.RelayState
+        '''
+        assert type(relay_id) == int
+
+        return RelayState.ON if (await self._get(f"/relay/{relay_id}"))['ison'] else RelayState.OFF
+
+    async def get_meter(self, meter_id):
+        '''get the readings of a power meter by id
+
+        meter_id: integer id of the meter
+
+        returns: meter status as JSON - power, total, counters...
+        '''
+        assert type(meter_id) == int
+
+        return await self._get(f"/meter/{meter_id}")
+
+    async def power(self, relay_id, state):
+        '''set the power state of the relay
+
+        relay_id: relay to set power state
+        state (bool): True == on; False == off
+
+        returns: shelly.RelayState
+        '''
+        assert type(relay_id) == int
+        assert type(state) == bool
+
+        url_state = "on" if state else "off"
+
+        if (await self._get(f"/relay/{relay_id}?turn={url_state}"))['ison']:
+            return RelayState.ON
+        else:
+            return RelayState.OFF
+
+    async def toggle(self, relay_id, native=None):
+        '''toggle the state of the relay
+
+        relay_id: relay to toggle
+        native: whether to use the firmware's turn=toggle (one request) or to read the state and
+                set the opposite one (two requests) - if not set, uses self.native_toggle
+
+        returns: shelly.RelayState
+        '''
+        assert type(relay_id) == int
+        assert native is None or type(native) == bool
+
+        if native is None:
+            native = self.native_toggle
+
+        if native:
+            if (await self._get(f"/relay/{relay_id}?turn=toggle"))['ison']:
+                return RelayState.ON
+            else:
+                return RelayState.OFF
+
+        if await self.get_relay_state(relay_id) == RelayState.ON:
+            return await self.power(relay_id, False)
+        else:
+            return await self.power(relay_id, True)
+
+    def _check_reentry(self):
+        if self._oscillation_task and not self._oscillation_task.done():
+            raise Exception('oscillation in progress')
+
+    async def oscillate(self, relay_id, period, block=True):
+        '''oscillate between on and off
+
+        relay_id: id of the relay to oscillate
+        period: length of time in seconds in each power state, on and off, during oscillation
+        block: whether or not this coroutine waits for the oscillation to end
+
+        returns: pyshelly.oscillation.Oscillation with per-edge lateness if block==True, otherwise
+                 a handle to asyncio.Task
+        '''
+        assert type(relay_id) == int
+        assert type(period) in (int, float)
+        assert period >= 0.05
+        assert type(block) == bool
+
+        self._check_reentry()
+
+        async def _oscillate():
+            self._oscillations = 0
+            await self._run_edges(relay_id, 1)
+
+        # Reset initial state of the flag
+        self._stop_oscillation = asyncio.Event()
+
+        self.oscillation = Oscillation(period)
+
+        return await self._run_oscillation(_oscillate(), block)
+
+    async def oscillate_timeout(self, relay_id, period, timeout, block=True, start_state=True, final_state=False):
+        '''oscillate until timeout has elapsed
+
+        relay_id: id of the relay to oscillate
+        period: length of time in seconds in each power state, on and off, during oscillation
+        timeout: amount of time in seconds after which oscillation halts
+        block: whether or not this coroutine waits for the oscillation to end
+        start_state: initial state of relay
+        final_state: state of the relay when oscillation halts
+
+        returns: pyshelly.oscillation.Oscillation with per-edge lateness if block==True, otherwise
+                 a handle to asyncio.Task
+        '''
+        assert type(relay_id) == int
+        assert type(period) in (int, float)
+        assert period >= 0.05
+        assert type(timeout) == int
+        assert timeout > 0
+        assert type(block) == bool
+        assert type(start_state) == bool
+        assert type(final_state) == bool
+
+        self._check_reentry()
+
+        async def _oscillate():
+            start = await self._set_state(relay_id, start_state, period)
+
+            self._oscillations = 0
+            await self._run_edges(relay_id, 1, start=start, final_state=final_state)
+            await self._wait_stop(self.oscillation.deadline())
+
+            await self._set_state(relay_id, final_state)
+
+        self._stop_oscillation = asyncio.Event()
+
+        self.oscillation = Oscillation(period, timeout=timeout)
+
+        return await self._run_oscillation(_oscillate(), block)
+
+    async def oscillate_cycles(self, relay_id, period, cycles, block=True, start_state=True, final_state=False):
+        '''oscillate a specific cycle count
+
+        relay_id: id of the relay to oscillate
+        period: length of time in seconds in each power state, on and off, during oscillation
+        cycles: number of cycles (a cycle is peak to peak)
+        block: whether or not this coroutine waits for the oscillation to end
+        start_state: initial state of relay
+        final_state: state of the relay when oscillation halts
+
+        returns: pyshelly.oscillation.Oscillation with per-edge lateness if block==True, otherwise
+                 a handle to asyncio.Task
+
+        NOTE: Count is NOT incremented by change of state TO the start_state. Counting begins only
+        after the initial start state is realized.
+        '''
+        assert type(relay_id) == int
+        assert type(period) in (int, float)
+        assert period >= 0.05
+        assert type(cycles) == int
+        assert cycles > 0
+        assert type(block) == bool
+        assert type(start_state) == bool
+        assert type(final_state) == bool
+
+        self._check_reentry()
+
+        async def _oscillate():
+            start = await self._set_state(relay_id, start_state, period)
+
+            # One toggle is half a cycle
+            self._oscillations = 0
+            await self._run_edges(relay_id, 0.5, start=start, final_state=final_state)
+
+            # Hold the last state for a full period before the final state
+            await self._wait_stop(self.oscillation.deadline())
+
+            await self._set_state(relay_id, final_state)
+
+        self._stop_oscillation = asyncio.Event()
+
+        self.oscillation = Oscillation(period, edges=2 * cycles)
+
+        return await self._run_oscillation(_oscillate(), block)
+
+    async def _set_state(self, relay_id, state, period=None):
+        '''set the state of a relay if it differs
+
+        returns: monotonic time one period after the state was changed, None if unchanged
+        '''
+        if (await self.get_relay_state(relay_id)).value != state:
+            await self.power(relay_id, state)
+            if period is not None:
+                return time.monotonic() + period
+
+    async def _wait_stop(self, until):
+        '''wait until monotonic time until or a stop
+
+        returns: True if the oscillation was stopped
+        '''
+        delay = until - time.monotonic()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(self._stop_oscillation.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        return self._stop_oscillation.is_set()
+
+    async def _run_edges(self, relay_id, increment, start=None, final_state=None):
+        '''asyncio counterpart of pyshelly.oscillation.Oscillation.run toggling relay_id
+
+        final_state: state to set the relay to, as a best effort, if an edge raises
+        '''
+        o = self.oscillation
+        o.begin(start)
+        while not o.exhausted():
+            if await self._wait_stop(o.fire_time()):
+                break
+
+            # After a stall, edges overdue by a full period are skipped, not sent in a burst
+            if o.skip_overdue():
+                continue
+
+            sent = time.monotonic()
+            try:
+                await self.toggle(relay_id)
+            except Exception as e:
+                o.exception = e
+                if final_state is not None:
+                    try:
+                        await self._set_state(relay_id, final_state)
+                    except Exception:
+                        pass
+                raise
+            o.record(sent, time.monotonic())
+
+            self._oscillations = self._oscillations + increment
+
+    async def _run_oscillation(self, coro, block):
+        task = asyncio.ensure_future(coro)
+        self._oscillation_task = task
+        if block:
+            await task
+            return self.oscillation
+        else:
+            return task
+
+    def stop_oscillation(self):
+        '''stop an oscillation operation'''
+        if self._stop_oscillation:
+            self._stop_oscillation.set()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+from .transport import HTTPStatusError, TransportError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(TransportError):
+    '''raised instead of sending a request to a module whose circuit is open'''
+    def __init__(self, host, retry_in):
+        super().__init__(f"circuit of {host} is open, next probe in {retry_in:.1f} seconds")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class _Circuit():
+    __slots__ = ("state", "failures", "opened", "probing")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+
+
+class CircuitBreaker():
+    def __init__(self, failures=3, reset_timeout=30):
+        '''fail fast on modules which stopped answering
+
+        A host's circuit opens after failures consecutive requests failed to get any answer
+        (timeouts, connection errors - an http error status is an answer). While it is open,
+        requests raise CircuitOpenError at once instead of waiting out a timeout. After
+        reset_timeout seconds the circuit is half-open: one request is let through as a probe,
+        and closes the circuit if it gets an answer or opens it again if it does not; other
+        requests still fail fast meanwhile.
+
+        failures - number of consecutive failures opening a circuit
+        reset_timeout - amount of time in seconds an open circuit waits before a probe
+
+        A breaker may be shared by any number of shelly objects, circuits are kept per host.
+        '''
+        assert type(failures) == int
+        assert failures > 0
+        assert reset_timeout > 0
+
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+
+        # host -> _Circuit
+        self._circuits = {}
+
+    def state(self, host):
+        '''returns: CLOSED, OPEN or HALF_OPEN - the state the next request to host would find'''
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None:
+                return CLOSED
+            if circuit.state == OPEN and time.monotonic() - circuit.opened >= self.reset_timeout:
+                return HALF_OPEN
+            return circuit.state
+
+    def states(self):
+        '''returns: dict - host -> state, for every host not closed'''
+        with self._lock:
+            hosts = list(self._circuits)
+        return {host: state for host in hosts for state in [self.state(host)] if state != CLOSED}
+
+    def before(self, host):
+        '''let a request to host through, or refuse it
+
+        raises: CircuitOpenError if the circuit is open, or half-open with a probe in flight
+        '''
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.state == CLOSED:
+                return
+
+            waited = time.monotonic() - circuit.opened
+            if circuit.state == OPEN and waited >= self.reset_timeout:
+                circuit.state = HALF_OPEN
+            if circuit.state == HALF_OPEN and not circuit.probing:
+                circuit.probing = True
+                return
+
+            raise CircuitOpenError(host, max(self.reset_timeout - waited, 0))
+
+    def after(self, host, error=None):
+        '''record the outcome of a request let through by before()
+
+        error: exception the request raised, None if it succeeded
+        '''
+        failed = isinstance(error, TransportError) and not isinstance(error, HTTPStatusError)
+
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if not failed:
+                if circuit is not None:
+                    del self._circuits[host]
+                return
+
+            if circuit is None:
+                circuit = self._circuits[host] = _Circuit()
+            circuit.failures = circuit.failures + 1
+            if circuit.state == HALF_OPEN or circuit.failures >= self.failures:
+                circuit.state = OPEN
+                circuit.opened = time.monotonic()
+            circuit.probing = False
+
+    def release(self, host):
+        '''forget a request let through by before() whose outcome tells nothing of the module,
+        e.g. one cut short by its caller's deadline - a probe may then be let through again
+        '''
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is not None:
+                circuit.probing = False
+
+    def reset(self, host=None):
+        '''close the circuit of host, of every host if not set'''
+        with self._lock:
+            if host is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(host, None)
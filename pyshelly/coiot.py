@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+import json
+import socket
+import struct
+import threading
+
+from .mirror import StateMirror
+from .models import RelayState
+
+# CoIoT multicast group and CoAP port used by Gen1 modules
+COIOT_GROUP = "224.0.1.187"
+COIOT_PORT = 5683
+
+# CoAP option carrying "<model>#<device id>#<coiot version>"
+_OPTION_DEVICE = 3332
+
+# Sensor ids reporting a relay output, CoIoT v2 (firmware >= 1.8) and v1 -> relay id
+_RELAY_SENSORS = {
+    1101: 0, 1201: 1, 1301: 2, 1401: 3,
+    112: 0, 122: 1, 132: 2, 142: 3,
+}
+
+
+def decode(packet):
+    '''decode a CoIoT status packet
+
+    packet: bytes of a CoAP datagram
+
+    returns: tuple - (device, relays) - device is the announced "<model>#<id>#<version>" string,
+             relays a dict of relay id -> shelly.RelayState. None if packet is not a CoIoT status.
+    '''
+    if len(packet) < 4 or packet[0] >> 6 != 1:
+        return None
+
+    tkl = packet[0] & 0x0f
+    i = 4 + tkl
+
+    try:
+        device, i = _decode_options(packet, i)
+    except (IndexError, struct.error):
+        return None
+
+    if device is None or i >= len(packet):
+        return None
+
+    try:
+        payload = json.loads(packet[i + 1:])
+    except ValueError:
+        return None
+
+    entries = payload.get("G", []) if type(payload) == dict else []
+
+    relays = {}
+    for entry in entries:
+        if type(entry) == list and len(entry) >= 3 and entry[1] in _RELAY_SENSORS:
+            relays[_RELAY_SENSORS[entry[1]]] = RelayState.ON if entry[2] else RelayState.OFF
+
+    return device, relays
+
+
+def encode(device, relays, message_id=0):
+    '''encode a CoIoT v2 status packet, as sent by a module
+
+    device: "<model>#<device id>#<coiot version>" string, e.g. "SHSW-1#AABBCC#2"
+    relays: dict of relay id -> shelly.RelayState or bool
+    message_id: CoAP message id
+
+    returns: bytes of a CoAP datagram
+    '''
+    sensors = {relay_id: sensor for sensor, relay_id in _RELAY_SENSORS.items() if sensor > 1000}
+    payload = json.dumps({"G": [[0, sensors[relay_id], int(RelayState(state).value)] \
+        for relay_id, state in sorted(relays.items())]}).encode()
+
+    # Non-confirmable message, code 0.30 as used by the modules, no token
+    header = struct.pack("!BBH", 0x50, 30, message_id)
+
+    value = device.encode()
+    delta = _OPTION_DEVICE - 269
+    if len(value) < 13:
+        option = struct.pack("!BH", 0xe0 | len(value), delta)
+    else:
+        option = struct.pack("!BHB", 0xed, delta, len(value) - 13)
+
+    return header + option + value + b"\xff" + payload
+
+
+def _decode_options(packet, i):
+    '''walk the CoAP options starting at offset i
+
+    returns: tuple - (device option value or None, offset of the payload marker)
+    '''
+    # Options are delta encoded, 13 and 14 announce one and two extension bytes
+    device = None
+    option = 0
+    while i < len(packet) and packet[i] != 0xff:
+        delta, length = packet[i] >> 4, packet[i] & 0x0f
+        i = i + 1
+        if delta == 13:
+            delta = packet[i] + 13
+            i = i + 1
+        elif delta == 14:
+            delta = struct.unpack_from("!H", packet, i)[0] + 269
+            i = i + 2
+        if length == 13:
+            length = packet[i] + 13
+            i = i + 1
+        elif length == 14:
+            length = struct.unpack_from("!H", packet, i)[0] + 269
+            i = i + 2
+        option = option + delta
+        if option == _OPTION_DEVICE:
+            device = packet[i:i + length].decode("utf-8", "replace")
+        i = i + length
+
+    return device, i
+
+
+class CoIoTListener():
+    def __init__(self, mirror=None, address="0.0.0.0", port=COIOT_PORT, group=COIOT_GROUP, interface="0.0.0.0"):
+        '''listen for the CoIoT status packets Gen1 modules multicast on every change and periodically
+
+        mirror - pyshelly.mirror.StateMirror to record relay states in - if not set, one is created
+        address - local address to bind to
+        port - local UDP port to bind to
+        group - multicast group to join - if None, only unicast packets are received
+        interface - address of the local interface joining the group
+
+        Relay states are recorded under the source address of the packet, so shelly objects must
+        use the module's IP address as their host to be answered from the mirror.
+        '''
+        self.mirror = mirror if mirror is not None else StateMirror()
+        self.address = address
+        self.port = port
+        self.group = group
+        self.interface = interface
+
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        '''bind the socket and start the listening thread
+
+        returns: self
+        '''
+        if self._thread and self._thread.is_alive():
+            raise Exception('listener already running')
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((self.address, self.port))
+        if self.group:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, \
+                socket.inet_aton(self.group) + socket.inet_aton(self.interface))
+
+        # Wake up periodically to notice stop()
+        sock.settimeout(0.5)
+
+        # The port actually bound, in case port 0 was asked for
+        self.port = sock.getsockname()[1]
+
+        self._sock = sock
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="pyshelly-coiot", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''stop the listening thread and close the socket'''
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                packet, (host, _) = self._sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            decoded = decode(packet)
+            if decoded is None:
+                continue
+
+            device, relays = decoded
+            for relay_id, state in relays.items():
+                self.mirror.update(host, relay_id, state, device=device)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import threading
+
+
+class _Pending():
+    __slots__ = ("turn", "futures")
+
+    def __init__(self):
+        # net effect of the commands collapsed so far: True (on), False (off), "toggle" or None
+        # (nothing, e.g. two toggles)
+        self.turn = None
+        self.futures = []
+
+
+class CommandQueue():
+    def __init__(self, shelly):
+        '''serialized, collapsing relay writes for one module
+
+        Gen1 modules handle one request at a time, so a burst of writes to a relay mostly waits
+        for the module only to reach states which are immediately superseded. Commands queued for
+        a relay while it waits its turn are collapsed into one request: a power() replaces
+        whatever was queued, a toggle() inverts a queued power(), and two queued toggles cancel
+        out. Every future of the collapsed commands resolves to the state the relay ended in.
+
+        shelly: pyshelly.Shelly1 the writes are issued with
+
+        Writes are issued one at a time, in the order relays were first queued, on a worker
+        thread which only runs while commands are pending.
+        '''
+        self.shelly = shelly
+
+        self._lock = threading.Lock()
+
+        # relay_id -> _Pending, in queueing order
+        self._pending = {}
+
+        self._worker = None
+        self._idle = threading.Condition(self._lock)
+
+        # number of commands queued, and of writes they were collapsed into
+        self.submitted = 0
+        self.sent = 0
+
+    def power(self, relay_id, state):
+        '''queue setting the power state of a relay
+
+        relay_id: relay to set power state
+        state (bool): True == on; False == off
+
+        returns: concurrent.futures.Future resolving to shelly.RelayState
+        '''
+        assert type(relay_id) == int
+        assert type(state) == bool
+
+        return self._queue(relay_id, lambda turn: state)
+
+    def toggle(self, relay_id):
+        '''queue toggling a relay
+
+        relay_id: relay to toggle
+
+        returns: concurrent.futures.Future resolving to shelly.RelayState
+        '''
+        assert type(relay_id) == int
+
+        def _collapse(turn):
+            if turn is None:
+                return "toggle"
+            if turn == "toggle":
+                return None
+            return not turn
+
+        return self._queue(relay_id, _collapse)
+
+    def pending(self):
+        '''returns: number of commands queued and not sent yet'''
+        with self._lock:
+            return sum(len(p.futures) for p in self._pending.values())
+
+    def join(self, timeout=None):
+        '''wait for every queued command to complete
+
+        timeout: amount of time in seconds to wait - if not set, waits forever
+
+        returns: True if the queue is idle
+        '''
+        with self._lock:
+            return self._idle.wait_for(lambda: self._worker is None, timeout)
+
+    def _queue(self, relay_id, collapse):
+        import concurrent.futures
+
+        future = concurrent.futures.Future()
+        with self._lock:
+            pending = self._pending.get(relay_id)
+            if pending is None:
+                pending = self._pending[relay_id] = _Pending()
+            pending.turn = collapse(pending.turn)
+            pending.futures.append(future)
+            self.submitted = self.submitted + 1
+
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._work, name=f"pyshelly-commands-{self.shelly.host}", \
+                    daemon=True)
+                self._worker.start()
+        return future
+
+    def _work(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._worker = None
+                    self._idle.notify_all()
+                    return
+                relay_id = next(iter(self._pending))
+                pending = self._pending.pop(relay_id)
+                if pending.turn is not None:
+                    self.sent = self.sent + 1
+
+            # Futures cancelled while queued are dropped, their command still counts
+            futures = [f for f in pending.futures if f.set_running_or_notify_cancel()]
+
+            try:
+                if pending.turn is None:
+                    # the commands cancelled out, report the state the relay is in
+                    state = self.shelly.get_relay_state(relay_id)
+                elif pending.turn == "toggle":
+                    state = self.shelly.toggle(relay_id)
+                else:
+                    state = self.shelly.power(relay_id, pending.turn)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future in futures:
+                    future.set_result(state)
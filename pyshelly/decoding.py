@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+import json
+import re
+
+
+def default_decoder():
+    '''get the fastest JSON decoder installed
+
+    returns: callable decoding bytes - orjson.loads, ujson.loads or json.loads, in that order
+    '''
+    try:
+        import orjson
+        return orjson.loads
+    except ImportError:
+        pass
+
+    try:
+        import ujson
+        return ujson.loads
+    except ImportError:
+        pass
+
+    return json.loads
+
+
+# Strings (keys included) and brackets, everything else between them is skipped
+_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+_COLON = re.compile(r'\s*:\s*')
+_PATH = re.compile(r'([^.\[\]]+)|\[(\*|\d+)\]')
+
+# bytes.translate() deletion table keeping only quotes, brackets and backslashes
+_NOT_STRUCTURE = bytes(c for c in range(256) if c not in b'"{}[]\\')
+
+
+class SelectiveDecoder():
+    def __init__(self, *paths):
+        '''decode only some fields of a JSON object
+
+        Only the values of the top-level keys named in paths are decoded, and then pruned to the
+        paths; the rest of the document is skipped without building anything. With orjson or
+        ujson installed, which decode a whole document faster than the stdlib json module
+        decodes a part, the document is decoded with them and then pruned. The result has the
+        shape of the document, restricted to the selected fields, e.g.
+        SelectiveDecoder("relays[*].ison") turns a /status response into
+        {"relays": [{"ison": True}]}.
+
+        paths - strings of dot separated keys, with [*] or [index] for list items,
+                e.g. "relays[*].ison", "wifi_sta.rssi", "meters[0].power"
+        '''
+        assert paths
+
+        self.paths = paths
+
+        # top-level key -> what to keep of its value, see _tree()
+        steps = []
+        for path in paths:
+            steps.append([key if key else (index if index == "*" else int(index)) \
+                for key, index in _PATH.findall(path)])
+            assert steps[-1] and type(steps[-1][0]) == str, f"invalid path {path!r}"
+        self._wanted = _tree(steps)
+
+        self._keys = re.compile('"(' + "|".join(re.escape(k) for k in self._wanted) + r')"\s*:\s*')
+        self._decoder = json.JSONDecoder()
+
+        decoder = default_decoder()
+        self._fast = decoder if decoder is not json.loads else None
+
+    def __call__(self, body):
+        '''decode body
+
+        returns: dict of the selected fields
+        '''
+        if self._fast is not None:
+            document = self._fast(body)
+            return _prune(document, self._wanted)
+
+        if type(body) == str:
+            text, body = body, body.encode("utf-8")
+        else:
+            text = body.decode("utf-8")
+
+        # The depth of a key can be told by counting brackets before it, as long as no string
+        # holds a bracket or an escaped quote - true of nearly every response. Between the
+        # quotes of the remaining skeleton there is then nothing.
+        skeleton = body.translate(None, _NOT_STRUCTURE)
+        if b"\\" in skeleton or any(skeleton.split(b'"')[1::2]):
+            return self._scan(text)
+
+        result = {}
+        for m in self._keys.finditer(text):
+            key, pos = m.group(1), m.start()
+            if key in result or text.count('"', 0, pos) % 2:
+                continue
+            depth = text.count("{", 0, pos) + text.count("[", 0, pos) - text.count("}", 0, pos) - \
+                text.count("]", 0, pos)
+            if depth == 1:
+                result[key] = _prune(self._decoder.raw_decode(text, m.end())[0], self._wanted[key])
+        return result
+
+    def _scan(self, text):
+        # Token by token, for documents with brackets or escapes in strings
+        result = {}
+        depth = 0
+        pos = 0
+        while len(result) < len(self._wanted):
+            m = _TOKENS.search(text, pos)
+            if m is None:
+                break
+            token = m.group()
+            pos = m.end()
+
+            if token in "{[":
+                depth = depth + 1
+            elif token in "}]":
+                depth = depth - 1
+            elif depth == 1:
+                colon = _COLON.match(text, pos)
+                if colon is None:
+                    continue
+                key = json.loads(token)
+                if key in self._wanted and key not in result:
+                    value, pos = self._decoder.raw_decode(text, colon.end())
+                    result[key] = _prune(value, self._wanted[key])
+
+        return result
+
+
+def _tree(paths):
+    # Paths (lists of steps) as nested dicts step -> subtree, None selecting the whole value; an
+    # index step also gets the paths going through [*]
+    if any(not p for p in paths):
+        return None
+    return {step: _tree([p[1:] for p in paths if p[0] == step or (type(step) == int and p[0] == "*")]) \
+        for step in dict.fromkeys(p[0] for p in paths)}
+
+
+_SKIP = object()
+
+
+def _prune(value, tree):
+    if tree is None:
+        return value
+
+    if type(value) == dict:
+        return {key: _prune(value[key], sub) for key, sub in tree.items() if key in value}
+
+    if type(value) == list:
+        every = tree.get("*", _SKIP)
+        if every is not _SKIP and len(tree) == 1:
+            return [_prune(item, every) for item in value]
+        pruned = []
+        for i, item in enumerate(value):
+            sub = tree.get(i, every)
+            pruned.append(None if sub is _SKIP else _prune(item, sub))
+        return pruned
+
+    return value
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import concurrent.futures
+import ipaddress
+import socket
+import struct
+import time
+
+from .shelly import Shelly1
+from .transport import HTTPClientTransport, TransportError
+
+MDNS_GROUP = "224.0.0.251"
+MDNS_PORT = 5353
+
+# Gen1 modules announce their web interface as an http service, named after their hostname
+_MDNS_SERVICE = "_http._tcp.local"
+
+
+def discover(network=None, mdns=False, timeout=0.5, max_workers=256, transport=None, mdns_timeout=1,
+             port=80, **kwargs):
+    '''find shelly modules by probing their unauthenticated /shelly endpoint
+
+    network: CIDR range to probe, e.g. "192.168.1.0/24", or an iterable of them
+    mdns: also probe the hosts answering an mDNS query for http services named shelly*
+    timeout: amount of time in seconds each probe waits to connect and get a response
+    max_workers: maximum number of probes in flight at the same time
+    transport: pyshelly.transport.Transport shared by the returned objects - if not set, each
+               creates its own
+    mdns_timeout: amount of time in seconds to collect mDNS answers for
+    port: TCP port of the modules' web interface
+    kwargs: passed on to pyshelly.Shelly1
+
+    A /22 (1022 hosts) with the defaults takes about 4 * timeout seconds, most of it waiting on
+    addresses nothing answers at.
+
+    returns: list of pyshelly.Shelly1, sorted by address, with info set
+    '''
+    assert network is not None or mdns
+    assert type(max_workers) == int
+    assert max_workers > 0
+
+    hosts = []
+    if network is not None:
+        for net in [network] if type(network) == str else network:
+            hosts.extend(str(ip) for ip in ipaddress.ip_network(net, strict=False).hosts())
+    if mdns:
+        hosts.extend(mdns_query(mdns_timeout))
+    hosts = sorted(set(hosts), key=_address_key)
+
+    if port != 80:
+        hosts = [f"{host}:{port}" for host in hosts]
+
+    # One connection at most per address, never kept beyond the scan
+    probes = HTTPClientTransport(pool_maxsize=1)
+
+    def _probe(host):
+        s = Shelly1(host, http_timeout=timeout, transport=probes)
+        try:
+            return s.device_info()
+        except (TransportError, ValueError, KeyError, TypeError):
+            # nothing listening, or something other than a shelly module
+            return None
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(hosts) or 1), \
+                thread_name_prefix="pyshelly-discover") as executor:
+            infos = list(executor.map(_probe, hosts))
+    finally:
+        probes.close()
+
+    found = []
+    for host, info in zip(hosts, infos):
+        if info is not None:
+            s = Shelly1(host, transport=transport, **kwargs)
+            s.info = info
+            found.append(s)
+    return found
+
+
+def mdns_query(timeout=1):
+    '''ask the local network for the addresses of shelly modules over mDNS
+
+    timeout: amount of time in seconds to collect answers for
+
+    returns: list of IP address strings of the hosts naming a shelly in their answers
+    '''
+    # One PTR question, asking for unicast answers (RFC 6762 5.4) so no port 5353 socket is needed
+    query = struct.pack("!6H", 0, 0, 1, 0, 0, 0)
+    for label in _MDNS_SERVICE.split("."):
+        query = query + bytes([len(label)]) + label.encode()
+    query = query + b"\0" + struct.pack("!2H", 12, 0x8001)
+
+    found = set()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+        sock.sendto(query, (MDNS_GROUP, MDNS_PORT))
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                answer, (address, _) = sock.recvfrom(9000)
+            except socket.timeout:
+                break
+            # Answers are not parsed further, the probe tells what the host is
+            if b"shelly" in answer.lower():
+                found.add(address)
+
+    return sorted(found, key=_address_key)
+
+
+def _address_key(host):
+    ip = ipaddress.ip_address(host)
+    return ip.version, ip
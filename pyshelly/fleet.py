@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+import concurrent.futures
+import threading
+import time
+
+from .transport import TransportTimeout
+
+
+class ShellyFleet():
+    def __init__(self, shellies=(), max_workers=64, timeout=None, metrics=None):
+        '''a set of shelly objects, keyed by host, operated on concurrently
+
+        shellies - iterable of pyshelly.Shelly1 (or objects with the same API)
+        max_workers - maximum number of devices operated on at the same time
+        timeout - amount of time in seconds each device gets to complete a fleet call - if not
+                  set, only the devices' own http_timeout applies
+        metrics - a pyshelly.metrics.Metrics recording the outcome and duration of each device in
+                  each fleet call, under the endpoint "fleet:<call>", including fleet timeouts
+
+        Fleet calls return a dict mapping each host to its result, or to the exception raised for
+        it; a device which did not complete within timeout maps to a
+        pyshelly.transport.TransportTimeout. One failing device never fails the call. The
+        status, relays, power and toggle calls also give timeout to each device as the deadline
+        of its call, so it ends in time too. A write which timed out may still have been applied
+        by the module.
+        '''
+        assert type(max_workers) == int
+        assert max_workers > 0
+        assert timeout is None or type(timeout) in (int, float)
+
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.metrics = metrics
+
+        self._shellies = {}
+        for s in shellies:
+            self.add(s)
+
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def add(self, shelly):
+        '''add a device, replacing any device with the same host'''
+        self._shellies[shelly.host] = shelly
+
+    def remove(self, host):
+        '''remove a device by host
+
+        returns: the removed device
+        '''
+        return self._shellies.pop(host)
+
+    def __getitem__(self, host):
+        return self._shellies[host]
+
+    def __contains__(self, host):
+        return host in self._shellies
+
+    def __iter__(self):
+        return iter(list(self._shellies.values()))
+
+    def __len__(self):
+        return len(self._shellies)
+
+    def hosts(self):
+        '''returns: list of the hosts in the fleet'''
+        return list(self._shellies)
+
+    def close(self, devices=False):
+        '''stop the worker threads
+
+        devices: also close every device in the fleet
+        '''
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True)
+        if devices:
+            for s in self:
+                s.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _select(self, hosts, where):
+        if hosts is None:
+            shellies = list(self._shellies.values())
+        else:
+            shellies = [self._shellies[h] for h in hosts]
+        if where is not None:
+            shellies = [s for s in shellies if where(s)]
+        return shellies
+
+    def map(self, fn, hosts=None, where=None, timeout=None, name="map"):
+        '''call fn(shelly) concurrently for the selected devices
+
+        fn: callable taking a shelly object
+        hosts: iterable of hosts to operate on - if not set, every device in the fleet
+        where: predicate taking a shelly object, selecting the devices to operate on
+        timeout: amount of time in seconds each device gets - if not set, self.timeout
+        name: name of the call in metrics
+
+        returns: dict - host -> result of fn or exception raised by it
+
+        A call of fn which runs out of timeout is reported as failed but not interrupted: it
+        keeps its worker busy until it returns, and what it writes may still be applied. Pass
+        the timeout on to fn's requests, e.g. as the deadline of a Shelly1 call, to bound it.
+        '''
+        if timeout is None:
+            timeout = self.timeout
+
+        shellies = self._select(hosts, where)
+        if not shellies:
+            return {}
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, \
+                    thread_name_prefix="pyshelly-fleet")
+            executor = self._executor
+
+        # A device's time starts when a worker picks it up, not when it is queued
+        started = {}
+        def _call(s):
+            started[s.host] = time.monotonic()
+            return fn(s)
+
+        futures = {s.host: executor.submit(_call, s) for s in shellies}
+
+        results = {}
+        pending = set(futures)
+        while pending:
+            wait = None
+            if timeout is not None:
+                now = time.monotonic()
+                wait = min((started[h] + timeout - now for h in pending if h in started), default=timeout)
+                wait = max(wait, 0)
+            concurrent.futures.wait([futures[h] for h in pending], timeout=wait, \
+                return_when=concurrent.futures.FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for host in list(pending):
+                f = futures[host]
+                if f.done():
+                    e = f.exception()
+                    results[host] = e if e is not None else f.result()
+                    pending.discard(host)
+                    self._record(name, host, started, now, e)
+                elif timeout is not None and host in started and now >= started[host] + timeout:
+                    results[host] = TransportTimeout(f"{host} did not complete within {timeout} seconds")
+                    pending.discard(host)
+                    self._record(name, host, started, now, results[host])
+
+        return results
+
+    def _record(self, name, host, started, now, error):
+        if self.metrics is not None:
+            self.metrics.record(host, "fleet:" + name, now - started.get(host, now), error=error)
+
+    def _deadline(self, timeout):
+        '''returns: keyword arguments bounding a device call to the fleet timeout, if any'''
+        if timeout is None:
+            timeout = self.timeout
+        return {} if timeout is None else {"deadline": timeout}
+
+    def status_all(self, hosts=None, where=None, timeout=None):
+        '''get the status of the selected devices
+
+        returns: dict - host -> module status as JSON or exception
+        '''
+        kwargs = self._deadline(timeout)
+        return self.map(lambda s: s.status(**kwargs), hosts, where, timeout, "status_all")
+
+    def relays_all(self, hosts=None, where=None, timeout=None):
+        '''get the relays of the selected devices
+
+        returns: dict - host -> list of tuples (id, shelly.RelayState) or exception
+        '''
+        kwargs = self._deadline(timeout)
+        return self.map(lambda s: s.get_relays(**kwargs), hosts, where, timeout, "relays_all")
+
+    def power_all(self, relay_id, state, hosts=None, where=None, timeout=None):
+        '''set the power state of a relay on the selected devices
+
+        relay_id: relay to set power state
+        state (bool): True == on; False == off
+
+        returns: dict - host -> shelly.RelayState or exception
+        '''
+        assert type(relay_id) == int
+        assert type(state) == bool
+
+        kwargs = self._deadline(timeout)
+        return self.map(lambda s: s.power(relay_id, state, **kwargs), hosts, where, timeout, "power_all")
+
+    def toggle_all(self, relay_id, hosts=None, where=None, timeout=None):
+        '''toggle a relay on the selected devices
+
+        relay_id: relay to toggle
+
+        returns: dict - host -> shelly.RelayState or exception
+        '''
+        assert type(relay_id) == int
+
+        kwargs = self._deadline(timeout)
+        return self.map(lambda s: s.toggle(relay_id, **kwargs), hosts, where, timeout, "toggle_all")
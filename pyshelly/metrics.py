@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import bisect
+import threading
+
+
+class Metrics():
+    # upper bounds in seconds of the latency histogram buckets
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, buckets=BUCKETS):
+        '''request counters and latency histograms per host and endpoint
+
+        Pass the same object to any number of shelly objects, fleets or transports. Recording is
+        a dict lookup and a bisect under one lock.
+
+        buckets - sorted upper bounds in seconds of the latency histogram buckets
+        '''
+        assert list(buckets) == sorted(buckets)
+
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+
+        # (host, endpoint) -> _Series
+        self._series = {}
+
+    def record(self, host, endpoint, seconds, nbytes=0, error=None):
+        '''record one request
+
+        host: host of the module
+        endpoint: path of the request, any query string is dropped
+        seconds: duration of the request
+        nbytes: size of the response body
+        error: exception raised by the request, if any
+        '''
+        endpoint = endpoint.split("?", 1)[0]
+        bucket = bisect.bisect_left(self.buckets, seconds)
+
+        with self._lock:
+            series = self._series.get((host, endpoint))
+            if series is None:
+                series = self._series[(host, endpoint)] = _Series(len(self.buckets))
+            series.requests = series.requests + 1
+            series.bytes = series.bytes + nbytes
+            series.seconds = series.seconds + seconds
+            series.counts[bucket] = series.counts[bucket] + 1
+            if error is not None:
+                name = type(error).__name__
+                series.errors[name] = series.errors.get(name, 0) + 1
+
+    def reset(self):
+        '''drop everything recorded so far'''
+        with self._lock:
+            self._series = {}
+
+    def snapshot(self):
+        '''get a copy of everything recorded so far
+
+        returns: dict - (host, endpoint) -> dict with keys requests, errors (dict of exception
+                 name -> count), bytes, seconds (total) and buckets (list of (upper bound, count),
+                 not cumulative, the last bound being inf)
+        '''
+        bounds = self.buckets + (float("inf"),)
+        with self._lock:
+            return {key: {"requests": s.requests, "errors": dict(s.errors), "bytes": s.bytes,
+                          "seconds": s.seconds, "buckets": list(zip(bounds, s.counts))}
+                    for key, s in self._series.items()}
+
+    def to_prometheus(self, prefix="pyshelly"):
+        '''export everything recorded so far in the Prometheus text exposition format
+
+        returns: str
+        '''
+        snapshot = sorted(self.snapshot().items())
+
+        lines = [f"# HELP {prefix}_requests_total Requests issued to shelly modules.",
+                 f"# TYPE {prefix}_requests_total counter"]
+        for (host, endpoint), s in snapshot:
+            lines.append(f"{prefix}_requests_total{_labels(host, endpoint)} {s['requests']}")
+
+        lines += [f"# HELP {prefix}_request_errors_total Failed requests by exception type.",
+                  f"# TYPE {prefix}_request_errors_total counter"]
+        for (host, endpoint), s in snapshot:
+            for error, count in sorted(s["errors"].items()):
+                lines.append(f"{prefix}_request_errors_total{_labels(host, endpoint, error=error)} {count}")
+
+        lines += [f"# HELP {prefix}_response_bytes_total Bytes of response bodies received.",
+                  f"# TYPE {prefix}_response_bytes_total counter"]
+        for (host, endpoint), s in snapshot:
+            lines.append(f"{prefix}_response_bytes_total{_labels(host, endpoint)} {s['bytes']}")
+
+        lines += [f"# HELP {prefix}_request_duration_seconds Request latency.",
+                  f"# TYPE {prefix}_request_duration_seconds histogram"]
+        for (host, endpoint), s in snapshot:
+            cumulative = 0
+            for bound, count in s["buckets"]:
+                cumulative = cumulative + count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{prefix}_request_duration_seconds_bucket{_labels(host, endpoint, le=le)} {cumulative}")
+            lines.append(f"{prefix}_request_duration_seconds_sum{_labels(host, endpoint)} {s['seconds']!r}")
+            lines.append(f"{prefix}_request_duration_seconds_count{_labels(host, endpoint)} {s['requests']}")
+
+        return "\n".join(lines) + "\n"
+
+
+class _Series():
+    __slots__ = ("requests", "errors", "bytes", "seconds", "counts")
+
+    def __init__(self, buckets):
+        self.requests = 0
+        self.errors = {}
+        self.bytes = 0
+        self.seconds = 0.0
+        self.counts = [0] * (buckets + 1)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(host, endpoint, **extra):
+    labels = [("host", host), ("endpoint", endpoint)] + list(extra.items())
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
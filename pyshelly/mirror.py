@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+
+class StateMirror():
+    def __init__(self):
+        '''in-memory copy of relay states pushed by shelly modules
+
+        Fed by pushed updates (pyshelly.coiot.CoIoTListener) and by the writes of shelly objects
+        using the mirror; shelly objects read it instead of polling while it is fresh. Safe to use
+        from any thread.
+        '''
+        self._lock = threading.Lock()
+
+        # host -> {relay_id: (shelly.RelayState, monotonic time updated)}
+        self._relays = {}
+
+        # host -> device id announced by the module
+        self._devices = {}
+
+        self._subscribers = []
+
+        # exception raised by the last subscriber which failed, None if none did
+        self.subscriber_error = None
+
+    def update(self, host, relay_id, state, device=None):
+        '''record the state of a relay
+
+        host: host of the module, as used for pyshelly.Shelly1(host)
+        relay_id: integer id of the relay
+        state: shelly.RelayState
+        device: device id announced by the module, if known
+        '''
+        with self._lock:
+            relays = self._relays.setdefault(host, {})
+            previous = relays.get(relay_id)
+            relays[relay_id] = (state, time.monotonic())
+            if device:
+                self._devices[host] = device
+            subscribers = list(self._subscribers) if not previous or previous[0] != state else []
+
+        for callback in subscribers:
+            try:
+                callback(host, relay_id, state)
+            except Exception as e:
+                # a broken subscriber must not stop the updates, e.g. kill a CoIoT listener
+                self.subscriber_error = e
+
+    def get(self, host, relay_id, max_age=None):
+        '''get the state of a relay
+
+        max_age: amount of time in seconds after which an update is stale - if not set, never
+
+        returns: shelly.RelayState or None if unknown or stale
+        '''
+        with self._lock:
+            entry = self._relays.get(host, {}).get(relay_id)
+        if entry and (max_age is None or time.monotonic() - entry[1] <= max_age):
+            return entry[0]
+        return None
+
+    def relays(self, host, max_age=None, count=None):
+        '''get the states of every relay known for a host
+
+        max_age: amount of time in seconds after which an update is stale - if not set, never
+        count: number of relays the module has - if set, relays 0 to count - 1 must all be known
+
+        returns: list of tuples - (id, shelly.RelayState) - or None if any is unknown or stale
+        '''
+        with self._lock:
+            known = self._relays.get(host, {})
+            if count is None:
+                entries = sorted(known.items())
+            elif all(relay_id in known for relay_id in range(count)):
+                entries = [(relay_id, known[relay_id]) for relay_id in range(count)]
+            else:
+                return None
+        if not entries:
+            return None
+        now = time.monotonic()
+        if max_age is not None and any(now - updated > max_age for _, (_, updated) in entries):
+            return None
+        return [(relay_id, state) for relay_id, (state, _) in entries]
+
+    def device(self, host):
+        '''returns: the device id announced by host, None if unknown'''
+        with self._lock:
+            return self._devices.get(host)
+
+    def hosts(self):
+        '''returns: list of hosts with known relay states'''
+        with self._lock:
+            return list(self._relays)
+
+    def forget(self, host):
+        '''drop everything known about a host'''
+        with self._lock:
+            self._relays.pop(host, None)
+            self._devices.pop(host, None)
+
+    def subscribe(self, callback):
+        '''call callback(host, relay_id, state) whenever a relay changes state
+
+        Called on the thread delivering the update, so it should return quickly. An exception
+        raised by callback is kept in subscriber_error, the update and other callbacks go on.
+        '''
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
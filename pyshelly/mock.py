@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+import json
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class MockShelly1():
+    def __init__(self, address="127.0.0.1", port=0, relays=1, latency=0, jitter=0, error_rate=0,
+                 drop_rate=0, max_connections=None, serial=True, seed=None):
+        '''local fake Gen1 module answering like a Shelly 1, for tests and benchmarks
+
+        address - local address to listen on
+        port - local TCP port to listen on - if 0, any free port
+        relays - number of relays the module has
+        latency - amount of time in seconds each request takes to process
+        jitter - maximum amount of time in seconds randomly added to or removed from latency
+        error_rate - probability of a request being answered with http status 500
+        drop_rate - probability of a connection being closed without answering a request
+        max_connections - number of connections the module accepts at the same time, further
+                          ones are closed straight away - if not set, no limit
+        serial - process one request at a time, as the module firmware does
+        seed - seed of the random generator for jitter and errors
+
+        Implements /shelly, /status, /settings, /settings/actions, /settings/relay/{id},
+        /relay/{id}[?turn=on|off|toggle] and /meter/{id}. The url to use is self.host once started.
+        '''
+        assert type(relays) == int
+        assert relays > 0
+        assert 0 <= error_rate <= 1
+        assert 0 <= drop_rate <= 1
+
+        self.address = address
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.max_connections = max_connections
+        self.serial = serial
+
+        self.mac = "A4CF12F00D01"
+        self.relays = [{"ison": False, "has_timer": False, "timer_started": 0, "timer_duration": 0,
+                        "timer_remaining": 0, "source": "http"} for _ in range(relays)]
+        self.meters = [{"power": 0.0, "is_valid": True, "overpower": 0.0, "timestamp": 0,
+                        "counters": [0.0, 0.0, 0.0], "total": 0} for _ in range(relays)]
+        self.actions = {}
+
+        # path (without query) -> number of requests answered
+        self.requests = {}
+
+        # number of connections currently open, and refused for exceeding max_connections
+        self.connections = 0
+        self.refused = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._serial_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._started = time.monotonic()
+
+    @property
+    def host(self):
+        '''host to give pyshelly.Shelly1 to reach this module'''
+        return f"{self.address}:{self.port}"
+
+    def start(self):
+        '''start serving on a background thread
+
+        returns: self
+        '''
+        if self._server:
+            raise Exception('mock already running')
+
+        mock = self
+
+        class _Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def verify_request(self, request, client_address):
+                with mock._lock:
+                    if mock.max_connections is not None and mock.connections >= mock.max_connections:
+                        mock.refused = mock.refused + 1
+                        return False
+                    mock.connections = mock.connections + 1
+                return True
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            # Buffer headers and body, they are flushed in one write after each request the way
+            # the module sends small responses
+            wbufsize = 65536
+
+            def do_GET(self):
+                mock._handle(self)
+
+            def finish(self):
+                super().finish()
+                with mock._lock:
+                    mock.connections = mock.connections - 1
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _Server((self.address, self.port), _Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="pyshelly-mock", \
+            daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''stop serving'''
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handle(self, handler):
+        u = urlsplit(handler.path)
+        query = {k: v[-1] for k, v in parse_qs(u.query).items()}
+
+        with self._lock:
+            self.requests[u.path] = self.requests.get(u.path, 0) + 1
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0)
+            drop = self._random.random() < self.drop_rate
+            error = self._random.random() < self.error_rate
+
+        if self.serial:
+            with self._serial_lock:
+                time.sleep(delay)
+                status, body = self._route(u.path, query)
+        else:
+            time.sleep(delay)
+            status, body = self._route(u.path, query)
+
+        if drop:
+            handler.close_connection = True
+            return
+        if error:
+            status, body = 500, {"error": "internal error"}
+
+        data = b"" if body is None else json.dumps(body).encode()
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _route(self, path, query):
+        parts = path.strip("/").split("/")
+
+        with self._lock:
+            if path == "/shelly":
+                return 200, {"type": "SHSW-1", "mac": self.mac, "auth": False,
+                             "fw": "20230913-112003/v1.14.0-gcb84623", "discoverable": False,
+                             "num_outputs": len(self.relays)}
+
+            if path == "/status":
+                return 200, self._status()
+
+            if path == "/settings":
+                return 200, {"device": {"type": "SHSW-1", "mac": self.mac,
+                                        "hostname": "shelly1-" + self.mac[-6:],
+                                        "num_outputs": len(self.relays)},
+                             "name": None, "fw": "20230913-112003/v1.14.0-gcb84623",
+                             "relays": [{"name": None, "default_state": "off"} for _ in self.relays]}
+
+            if path == "/settings/actions":
+                if "name" in query:
+                    self.actions[(int(query.get("index", 0)), query["name"])] = {
+                        "enabled": query.get("enabled") == "true", "urls": [query.get("urls[]", "")]}
+                return 200, {"actions": {name: [dict(action, index=index)]
+                                         for (index, name), action in self.actions.items()}}
+
+            relay_id = self._index(parts, self.relays)
+
+            if len(parts) == 3 and parts[:2] == ["settings", "relay"] and relay_id is not None:
+                for name, url in query.items():
+                    self.actions[(relay_id, name)] = {"enabled": bool(url), "urls": [url]}
+                return 200, {"name": None, "default_state": "off"}
+
+            if len(parts) == 2 and parts[0] == "relay" and relay_id is not None:
+                relay = self.relays[relay_id]
+                turn = query.get("turn")
+                if turn == "on":
+                    relay["ison"] = True
+                elif turn == "off":
+                    relay["ison"] = False
+                elif turn == "toggle":
+                    relay["ison"] = not relay["ison"]
+                elif turn is not None:
+                    return 400, None
+                return 200, dict(relay)
+
+            meter_id = self._index(parts, self.meters)
+            if len(parts) == 2 and parts[0] == "meter" and meter_id is not None:
+                return 200, dict(self.meters[meter_id])
+
+        return 404, None
+
+    def _index(self, parts, items):
+        if len(parts) < 2:
+            return None
+        try:
+            i = int(parts[-1])
+        except ValueError:
+            return None
+        return i if 0 <= i < len(items) else None
+
+    def _status(self):
+        uptime = int(time.monotonic() - self._started)
+        return {
+            "wifi_sta": {"connected": True, "ssid": "pyshelly", "ip": self.address, "rssi": -58},
+            "cloud": {"enabled": False, "connected": False},
+            "mqtt": {"connected": False},
+            "time": "12:00", "unixtime": int(time.time()), "serial": 1, "has_update": False,
+            "mac": self.mac,
+            "cfg_changed_cnt": 0,
+            "actions_stats": {"skipped": 0},
+            "relays": [dict(r) for r in self.relays],
+            "meters": [dict(m) for m in self.meters],
+            "inputs": [{"input": 0, "event": "", "event_cnt": 0} for _ in self.relays],
+            "ext_sensors": {}, "ext_temperature": {}, "ext_humidity": {},
+            "update": {"status": "idle", "has_update": False,
+                       "new_version": "20230913-112003/v1.14.0-gcb84623",
+                       "old_version": "20230913-112003/v1.14.0-gcb84623"},
+            "ram_total": 50256, "ram_free": 38016, "fs_size": 233681, "fs_free": 149094,
+            "uptime": uptime,
+        }
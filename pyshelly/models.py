@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+from enum import Enum
+
+class RelayState(Enum):
+    ON = True
+    OFF = False
+
+
+class Relay():
+    __slots__ = ("id", "ison", "has_timer", "timer_remaining", "source")
+
+    def __init__(self, id, ison, has_timer=False, timer_remaining=0, source=None):
+        '''state of one relay
+
+        id - integer id of the relay
+        ison - whether the relay is on
+        has_timer - whether a flip-back timer is running
+        timer_remaining - seconds left on the timer
+        source - what last switched the relay, e.g. "http", "input", "timer"
+        '''
+        self.id = id
+        self.ison = ison
+        self.has_timer = has_timer
+        self.timer_remaining = timer_remaining
+        self.source = source
+
+    @classmethod
+    def from_json(cls, relay_id, d):
+        return cls(relay_id, bool(d.get('ison')), bool(d.get('has_timer')), d.get('timer_remaining', 0), \
+            d.get('source'))
+
+    @property
+    def state(self):
+        '''returns: shelly.RelayState'''
+        return RelayState.ON if self.ison else RelayState.OFF
+
+    def __repr__(self):
+        return f"Relay(id={self.id}, ison={self.ison})"
+
+
+class Meter():
+    __slots__ = ("id", "power", "total", "is_valid")
+
+    def __init__(self, id, power, total=0, is_valid=True):
+        '''readings of one power meter
+
+        id - integer id of the meter
+        power - current power in watts
+        total - energy in watt-minutes since boot
+        is_valid - whether the readings are valid
+        '''
+        self.id = id
+        self.power = power
+        self.total = total
+        self.is_valid = is_valid
+
+    @classmethod
+    def from_json(cls, meter_id, d):
+        return cls(meter_id, d.get('power', 0.0), d.get('total', 0), bool(d.get('is_valid', True)))
+
+    def __repr__(self):
+        return f"Meter(id={self.id}, power={self.power})"
+
+
+class Wifi():
+    __slots__ = ("connected", "ssid", "ip", "rssi")
+
+    def __init__(self, connected, ssid=None, ip=None, rssi=None):
+        '''wifi station state of a module'''
+        self.connected = connected
+        self.ssid = ssid
+        self.ip = ip
+        self.rssi = rssi
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(bool(d.get('connected')), d.get('ssid'), d.get('ip'), d.get('rssi'))
+
+    def __repr__(self):
+        return f"Wifi(connected={self.connected}, ssid={self.ssid!r}, rssi={self.rssi})"
+
+
+class DeviceInfo():
+    __slots__ = ("type", "mac", "fw", "auth", "num_outputs", "num_meters")
+
+    def __init__(self, type, mac, fw=None, auth=False, num_outputs=None, num_meters=None):
+        '''identity of a module, as reported by the unauthenticated /shelly endpoint
+
+        type - model code, e.g. "SHSW-1" for the Shelly 1
+        mac - MAC address, upper case hex without separators
+        fw - firmware version string
+        auth - whether the module requires http authentication
+        num_outputs - number of relays
+        num_meters - number of power meters
+        '''
+        self.type = type
+        self.mac = mac
+        self.fw = fw
+        self.auth = auth
+        self.num_outputs = num_outputs
+        self.num_meters = num_meters
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(d['type'], d['mac'], d.get('fw'), bool(d.get('auth')), d.get('num_outputs'), \
+            d.get('num_meters'))
+
+    def __repr__(self):
+        return f"DeviceInfo(type={self.type!r}, mac={self.mac!r}, fw={self.fw!r})"
+
+
+class Status():
+    __slots__ = ("mac", "uptime", "unixtime", "has_update", "_relays", "_meters", "_wifi")
+
+    def __init__(self, d):
+        '''compact, typed view of a /status response
+
+        Only the fields modelled here are kept, the rest of the response (cloud, mqtt, update,
+        sensors...) is not referenced, so the response dict can be freed. Relays, meters and wifi
+        are built from their part of the response on first access.
+
+        d - decoded /status JSON
+        '''
+        self.mac = d.get('mac')
+        self.uptime = d.get('uptime')
+        self.unixtime = d.get('unixtime')
+        self.has_update = bool(d.get('has_update'))
+        self._relays = d.get('relays', [])
+        self._meters = d.get('meters', [])
+        self._wifi = d.get('wifi_sta', {})
+
+    @property
+    def relays(self):
+        '''returns: tuple of pyshelly.models.Relay'''
+        if type(self._relays) == list:
+            self._relays = tuple(Relay.from_json(i, r) for i, r in enumerate(self._relays))
+        return self._relays
+
+    @property
+    def meters(self):
+        '''returns: tuple of pyshelly.models.Meter'''
+        if type(self._meters) == list:
+            self._meters = tuple(Meter.from_json(i, m) for i, m in enumerate(self._meters))
+        return self._meters
+
+    @property
+    def wifi(self):
+        '''returns: pyshelly.models.Wifi'''
+        if type(self._wifi) == dict:
+            self._wifi = Wifi.from_json(self._wifi)
+        return self._wifi
+
+    def __repr__(self):
+        return f"Status(mac={self.mac!r}, uptime={self.uptime}, relays={self.relays})"
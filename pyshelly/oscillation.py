@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+
+class Edge():
+    __slots__ = ("index", "intended", "sent", "received")
+
+    def __init__(self, index, intended, sent, received):
+        '''timing of one oscillation edge, all times are time.monotonic() values
+
+        index - number of the edge in its run, from 0
+        intended - deadline of the edge
+        sent - time the request was sent, None if the edge was skipped
+        received - time the response was received, None if the edge was skipped
+        '''
+        self.index = index
+        self.intended = intended
+        self.sent = sent
+        self.received = received
+
+    @property
+    def skipped(self):
+        '''whether the edge was skipped, being overdue by a full period or more'''
+        return self.sent is None
+
+    @property
+    def actual(self):
+        '''estimated time the module switched, half way through the round trip - None if skipped'''
+        return None if self.skipped else (self.sent + self.received) / 2
+
+    @property
+    def latency(self):
+        '''request round trip time in seconds - None if skipped'''
+        return None if self.skipped else self.received - self.sent
+
+    @property
+    def lateness(self):
+        '''seconds the edge landed after its deadline (negative when early) - None if skipped'''
+        return None if self.skipped else self.actual - self.intended
+
+    def __repr__(self):
+        if self.skipped:
+            return f"Edge(index={self.index}, skipped)"
+        return f"Edge(index={self.index}, lateness={self.lateness:.4f}, latency={self.latency:.4f})"
+
+
+class Oscillation():
+    # weight of the newest sample in the smoothed round trip time
+    LATENCY_SMOOTHING = 0.2
+
+    # phases of a run
+    _SETUP, _EDGES, _HOLD, _DONE = range(4)
+
+    def __init__(self, period, edge=None, edges=None, timeout=None, setup=None, finish=None, late=None):
+        '''an oscillation run, and the handle to it
+
+        Edges are scheduled against absolute time.monotonic() deadlines, start + n * period, so
+        request latency and sleep overshoot do not accumulate into drift. Each request is issued
+        early by half the smoothed round trip time so the module switches close to its deadline.
+        After a stall, edges overdue by a full period are skipped two by two rather than sent
+        back to back, so the relay stays in the state the schedule has it in.
+
+        A run is a sequence of short steps, so it can either block the calling thread (run()) or
+        be multiplexed with others onto a pyshelly.scheduler.Scheduler.
+
+        period: length of time in seconds between two edges
+        edge: callable performing one edge
+        edges: number of edges to run - if not set, runs until stopped
+        timeout: amount of time in seconds from the first edge at or after which no edge is started
+        setup: callable run before the first edge, returning the monotonic time of the first edge
+               or None for now
+        finish: callable run once after the last edge has lasted a full period, on cancel, or
+                right after an edge raised
+        late: lateness in seconds above which an edge counts as late - if not set, a tenth of
+              period. An edge landing a full period or more after its deadline counts as missed.
+        '''
+        assert type(period) in (int, float)
+        assert period > 0
+        assert edges is None or type(edges) == int
+        assert timeout is None or type(timeout) in (int, float)
+
+        self.period = period
+        self.edges = edges
+        self.timeout = timeout
+        self.late = period / 10 if late is None else late
+
+        self._edge = edge
+        self._setup = setup
+        self._finish = finish
+
+        # monotonic time of edge 0
+        self.start = None
+
+        # number of edges done so far
+        self.count = 0
+
+        # pyshelly.oscillation.Edge of every edge done or skipped so far
+        self.edge_log = []
+
+        # number of edges skipped so far
+        self.skipped = 0
+
+        # smoothed request round trip time in seconds
+        self.latency = 0.0
+
+        # exception which ended the run, if any
+        self.exception = None
+
+        self._phase = self._SETUP
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+        self._scheduler = None
+
+    def begin(self, start=None):
+        '''anchor the schedule
+
+        start: monotonic time of the first edge - if not set, now
+        '''
+        self.start = time.monotonic() if start is None else start
+        self.count = 0
+        self.edge_log = []
+        self.skipped = 0
+
+    @property
+    def lateness(self):
+        '''seconds each edge sent landed after its deadline (negative when early)'''
+        return [e.lateness for e in list(self.edge_log) if not e.skipped]
+
+    def exhausted(self):
+        '''returns: whether no edge is left to run'''
+        if self.edges is not None and self.count >= self.edges:
+            return True
+        return self.timeout is not None and self.deadline() >= self.start + self.timeout
+
+    def deadline(self, n=None):
+        '''returns: monotonic deadline of edge n, the next edge if not set'''
+        if n is None:
+            n = self.count
+        return self.start + n * self.period
+
+    def fire_time(self):
+        '''returns: monotonic time at which the request for the next edge should be sent'''
+        return self.deadline() - self.latency / 2
+
+    def skip_overdue(self, now=None):
+        '''skip the edges overdue by a full period or more, an even number of them so the relay
+        is left in the state the schedule has it in - the next edge is then due within a period
+
+        now: monotonic time - if not set, now
+
+        returns: number of edges skipped, recorded in edge_log
+        '''
+        overdue = int(((time.monotonic() if now is None else now) - self.deadline()) // self.period)
+        if overdue < 1:
+            return 0
+
+        # Skipping one more when odd also skips the edge due last, the next one is not due yet
+        skip = overdue + overdue % 2
+        if self.edges is not None:
+            skip = min(skip, self.edges - self.count)
+            skip = skip - skip % 2
+
+        for _ in range(skip):
+            self.edge_log.append(Edge(self.count, self.deadline(), None, None))
+            self.count = self.count + 1
+        self.skipped = self.skipped + skip
+        return skip
+
+    def record(self, sent, received):
+        '''record the request for the next edge
+
+        sent: monotonic time at which the request was sent
+        received: monotonic time at which the response was received
+        '''
+        rtt = received - sent
+        if self.count == self.skipped:
+            self.latency = rtt
+        else:
+            self.latency = self.latency + self.LATENCY_SMOOTHING * (rtt - self.latency)
+
+        self.edge_log.append(Edge(self.count, self.deadline(), sent, received))
+        self.count = self.count + 1
+
+    def telemetry(self):
+        '''summarize the timing of the edges done so far, safe to call while the run goes on
+
+        returns: dict with keys
+                 edges - number of edges done
+                 skipped - number of edges skipped after a stall
+                 late - number of edges later than self.late
+                 missed - number of edges a full period or more late, skipped ones included
+                 max_lateness, mean_lateness - seconds, None without edges
+                 mean_latency, max_latency - request round trip in seconds, None without edges
+                 frequency - requested cycles per second, 1 / (2 * period)
+                 achieved_frequency - cycles per second measured between the first and the last
+                                      edge, None with less than two edges
+        '''
+        log = list(self.edge_log)
+        skipped = len(log)
+        log = [e for e in log if not e.skipped]
+        skipped = skipped - len(log)
+        lateness = [e.lateness for e in log]
+        latency = [e.latency for e in log]
+
+        achieved = None
+        if len(log) > 1 and log[-1].actual > log[0].actual:
+            # One edge is half a cycle, skipped ones included
+            achieved = (log[-1].index - log[0].index) / 2 / (log[-1].actual - log[0].actual)
+
+        return {
+            "edges": len(log),
+            "skipped": skipped,
+            "late": sum(1 for l in lateness if l > self.late),
+            "missed": sum(1 for l in lateness if l >= self.period) + skipped,
+            "max_lateness": max(lateness) if log else None,
+            "mean_lateness": sum(lateness) / len(log) if log else None,
+            "max_latency": max(latency) if log else None,
+            "mean_latency": sum(latency) / len(log) if log else None,
+            "frequency": 1 / (2 * self.period),
+            "achieved_frequency": achieved,
+        }
+
+    def _step(self):
+        '''advance the run
+
+        returns: monotonic time at which the next step is due, None when the run is over
+        '''
+        try:
+            if self._phase == self._SETUP:
+                self.begin(self._setup() if self._setup else None)
+                self._phase = self._EDGES
+
+            if self._phase == self._EDGES:
+                if not self._stop.is_set() and not self.exhausted():
+                    if time.monotonic() < self.fire_time():
+                        return self.fire_time()
+
+                    # After a stall, edges overdue by a full period are skipped, not sent in a burst
+                    self.skip_overdue()
+
+                    if not self.exhausted():
+                        if time.monotonic() < self.fire_time():
+                            return self.fire_time()
+
+                        sent = time.monotonic()
+                        self._edge()
+                        self.record(sent, time.monotonic())
+
+                    if not self.exhausted():
+                        return self.fire_time()
+
+                # Hold the last state for a full period before finishing
+                self._phase = self._HOLD
+                if not self._stop.is_set() and time.monotonic() < self.deadline():
+                    return self.deadline()
+
+            if self._phase == self._HOLD:
+                if self._finish:
+                    self._finish()
+        except Exception as e:
+            self.exception = e
+            if self._phase == self._EDGES and self._finish:
+                # The final state still follows the last edge, as a best effort; the exception
+                # reported is the edge's
+                try:
+                    self._finish()
+                except Exception:
+                    pass
+
+        self._phase = self._DONE
+        self._finished.set()
+        return None
+
+    def _abort(self):
+        '''end the run at once, without further edges nor finish - its scheduler shut down'''
+        self._stop.set()
+        self._phase = self._DONE
+        self._finished.set()
+
+    def run(self):
+        '''run the oscillation on the calling thread, blocking
+
+        raises: the exception which ended the run, if any
+        '''
+        due = self._step()
+        while due is not None:
+            delay = due - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            due = self._step()
+
+        if self.exception:
+            raise self.exception
+
+    def schedule(self, scheduler):
+        '''run the oscillation on a pyshelly.scheduler.Scheduler
+
+        returns: self
+        '''
+        self._scheduler = scheduler
+        return scheduler.submit(self)
+
+    def cancel(self):
+        '''stop the oscillation, the next step finishes it without further edges'''
+        self._stop.set()
+        if self._scheduler:
+            self._scheduler.wake(self)
+
+    def cancelled(self):
+        '''returns: whether cancel() was called'''
+        return self._stop.is_set()
+
+    def running(self):
+        '''returns: whether the run has not finished yet'''
+        return not self._finished.is_set()
+
+    def join(self, timeout=None):
+        '''wait for the run to finish
+
+        timeout: amount of time in seconds to wait - if not set, waits forever
+
+        returns: True if the run has finished
+        '''
+        return self._finished.wait(timeout)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+import random
+import threading
+import time
+
+from .scheduler import Scheduler
+
+
+def relay_snapshot(shelly):
+    '''read what a poller compares by default: the relay states, from the smallest endpoint
+
+    returns: tuple of (id, shelly.RelayState)
+    '''
+    return tuple(shelly.get_relays())
+
+
+class _Poll():
+    __slots__ = ("poller", "shelly", "interval", "snapshot", "polls", "changes", "error", "_lock")
+
+    def __init__(self, poller, shelly):
+        # one device, a job of the scheduler
+        self.poller = poller
+        self.shelly = shelly
+        self.interval = poller.min_interval
+        self.snapshot = None
+        self.polls = 0
+        self.changes = 0
+        self.error = None
+        self._lock = threading.Lock()
+
+    def _step(self):
+        return self.poller._poll(self)
+
+
+class AdaptivePoller():
+    def __init__(self, shellies=(), min_interval=1, max_interval=60, backoff=1.5, jitter=0.1, read=None,
+                 scheduler=None, seed=None):
+        '''poll devices at intervals adapted to how often they change
+
+        Each device starts at min_interval. Every poll finding no change stretches its interval by
+        backoff, up to max_interval; a change, or a nudge() after a command, brings it back to
+        min_interval. Idle relays end up polled every max_interval, busy ones every
+        min_interval.
+
+        Devices added together have their first polls spread evenly over min_interval, and every
+        interval is stretched or shrunk at random by up to jitter (a fraction), so polls do not
+        bunch up on the network or the scheduler.
+
+        Polls compare a cheap snapshot of each device with the previous one, and subscribers are
+        only called when it differs.
+
+        shellies - iterable of pyshelly.Shelly1 to poll
+        min_interval - shortest amount of time in seconds between two polls of a device
+        max_interval - longest amount of time in seconds between two polls of a device
+        backoff - factor the interval grows by after a poll without change
+        jitter - fraction of the interval by which each one is randomly shortened or lengthened
+        read - callable taking a shelly object and returning its snapshot, any value comparable
+               with == - if not set, relay_snapshot, the relay states
+        scheduler - a pyshelly.scheduler.Scheduler running the polls - if not set, one is created
+                    and owned (shut down by close()) by this object. A poll blocks its worker for
+                    up to http_timeout, so polls of offline devices must not share workers with
+                    oscillations, as they would with the default shared scheduler.
+        seed - seed of the jitter, for reproducible intervals
+        '''
+        assert 0 < min_interval <= max_interval
+        assert backoff >= 1
+        assert 0 <= jitter < 1
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.read = read or relay_snapshot
+        if scheduler is None:
+            self.scheduler = Scheduler()
+            self._owns_scheduler = True
+        else:
+            self.scheduler = scheduler
+            self._owns_scheduler = False
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # host -> _Poll
+        self._polls = {}
+
+        self._subscribers = []
+
+        self.add(*shellies)
+
+    def add(self, *shellies):
+        '''start polling devices, their first polls spread over min_interval'''
+        now = time.monotonic()
+        with self._lock:
+            polls = []
+            for s in shellies:
+                if s.host in self._polls:
+                    continue
+                polls.append(self._polls.setdefault(s.host, _Poll(self, s)))
+
+        for i, poll in enumerate(polls):
+            self.scheduler.submit(poll, now + i * self.min_interval / len(polls))
+
+    def remove(self, host):
+        '''stop polling a device'''
+        with self._lock:
+            poll = self._polls.pop(host)
+        self.scheduler.cancel(poll)
+
+    def close(self):
+        '''stop polling every device, and shut down the scheduler if it is owned by this object'''
+        with self._lock:
+            polls, self._polls = list(self._polls.values()), {}
+        for poll in polls:
+            self.scheduler.cancel(poll)
+        if self._owns_scheduler:
+            self.scheduler.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def hosts(self):
+        '''returns: list of the hosts polled'''
+        with self._lock:
+            return list(self._polls)
+
+    def nudge(self, host):
+        '''poll a device now and go back to min_interval, e.g. right after commanding it'''
+        with self._lock:
+            poll = self._polls.get(host)
+        if poll is not None:
+            with poll._lock:
+                poll.interval = self.min_interval
+            self.scheduler.wake(poll)
+
+    def subscribe(self, callback):
+        '''call callback(host, previous, current) whenever the snapshot of a device changes
+
+        previous is None on the first poll of a device. Called on a scheduler worker thread, so
+        it should return quickly.
+        '''
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def snapshot(self, host):
+        '''returns: the last snapshot of a device, None before its first poll'''
+        return self._polls[host].snapshot
+
+    def stats(self):
+        '''returns: dict - host -> dict with keys
+                    interval - current amount of time in seconds between polls
+                    polls - number of polls done
+                    changes - number of polls which found a change
+                    error - exception raised by the last poll, None if it succeeded
+        '''
+        with self._lock:
+            polls = list(self._polls.values())
+        return {p.shelly.host: {"interval": p.interval, "polls": p.polls, "changes": p.changes, "error": p.error}
+                for p in polls}
+
+    def _poll(self, poll):
+        '''poll one device
+
+        returns: monotonic time of its next poll, None once it was removed
+        '''
+        if self._polls.get(poll.shelly.host) is not poll:
+            return None
+
+        try:
+            current = self.read(poll.shelly)
+        except Exception as e:
+            current, error = None, e
+        else:
+            error = None
+
+        with poll._lock:
+            poll.polls = poll.polls + 1
+            poll.error = error
+            previous = poll.snapshot
+            changed = error is None and current != previous
+            if changed:
+                poll.snapshot = current
+                poll.changes = poll.changes + 1
+                poll.interval = self.min_interval
+            else:
+                # A failing device is backed off like an idle one
+                poll.interval = min(poll.interval * self.backoff, self.max_interval)
+            interval = poll.interval
+
+        if changed:
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for callback in subscribers:
+                try:
+                    callback(poll.shelly.host, previous, current)
+                except Exception as e:
+                    # a broken subscriber must not stop the polls, it shows in stats()
+                    poll.error = e
+
+        with self._lock:
+            spread = self._random.uniform(1 - self.jitter, 1 + self.jitter)
+        return time.monotonic() + interval * spread
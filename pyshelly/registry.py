@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from .shelly import Shelly1
+
+# Version of the file format written by save()
+_FORMAT = 1
+
+
+class DeviceRecord():
+    __slots__ = ("mac", "host", "type", "fw", "last_seen", "tags")
+
+    def __init__(self, mac, host, type=None, fw=None, last_seen=None, tags=()):
+        '''what a registry knows about a module
+
+        mac - MAC address, upper case hex without separators, identifying the module
+        host - the hostname or IP address the module was last seen at
+        type - model code, e.g. "SHSW-1"
+        fw - firmware version string
+        last_seen - time.time() the module was last added or seen
+        tags - set of strings
+        '''
+        self.mac = mac
+        self.host = host
+        self.type = type
+        self.fw = fw
+        self.last_seen = last_seen
+        self.tags = frozenset(tags)
+
+    @classmethod
+    def from_json(cls, d):
+        return cls(d['mac'], d['host'], d.get('type'), d.get('fw'), d.get('last_seen'), d.get('tags', ()))
+
+    def to_json(self):
+        return {"mac": self.mac, "host": self.host, "type": self.type, "fw": self.fw,
+                "last_seen": self.last_seen, "tags": sorted(self.tags)}
+
+    def __repr__(self):
+        return f"DeviceRecord(mac={self.mac!r}, host={self.host!r}, type={self.type!r}, tags={sorted(self.tags)})"
+
+
+class DeviceRegistry():
+    def __init__(self, path=None, mirror=None, **kwargs):
+        '''known modules, persisted to a JSON file and indexed by MAC, host, model, tag and relay state
+
+        path - file the registry is loaded from, if it exists, and saved to - if not set, the
+               registry lives in memory only
+        mirror - a pyshelly.mirror.StateMirror whose relay states are indexed, for
+                 find(relay_state=...) - it is also passed to the shelly objects created
+        kwargs - passed on to the pyshelly.Shelly1 objects created by shelly() and fleet(),
+                 e.g. transport to share one transport between them
+
+        Safe to use from any thread.
+        '''
+        self.path = path
+        self.mirror = mirror
+        self._kwargs = kwargs
+
+        self._lock = threading.RLock()
+
+        # mac -> DeviceRecord
+        self._records = {}
+
+        # host -> mac
+        self._hosts = {}
+
+        # model -> set of macs, tag -> set of macs
+        self._types = {}
+        self._tags = {}
+
+        # (relay id, shelly.RelayState) -> set of macs, fed by the mirror
+        self._states = {}
+
+        # mac -> pyshelly.Shelly1 created for it
+        self._shellies = {}
+
+        if path and os.path.exists(path):
+            self.load()
+
+        if mirror is not None:
+            for host in mirror.hosts():
+                for relay_id, state in mirror.relays(host) or ():
+                    self._relay_changed(host, relay_id, state)
+            mirror.subscribe(self._relay_changed)
+
+    def load(self):
+        '''replace the records with those saved in self.path'''
+        with open(self.path, "r", encoding="utf-8") as f:
+            d = json.load(f)
+        if d.get('format') != _FORMAT:
+            raise ValueError(f"{self.path}: unsupported registry format {d.get('format')!r}")
+
+        with self._lock:
+            for mac in list(self._records):
+                self._unindex(self._records.pop(mac))
+            for r in d['devices']:
+                self._index(DeviceRecord.from_json(r))
+            for mac, s in list(self._shellies.items()):
+                if mac not in self._records or self._records[mac].host != s.host:
+                    del self._shellies[mac]
+
+    def save(self):
+        '''write the records to self.path
+
+        The file is replaced atomically, a crash leaves either the previous or the new registry.
+        '''
+        assert self.path
+
+        with self._lock:
+            data = {"format": _FORMAT, "devices": [r.to_json() for r in self._records.values()]}
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix=".registry-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def add(self, shelly, tags=()):
+        '''record a module, or refresh its record, keeping its tags
+
+        shelly: pyshelly.Shelly1 - device_info() is called if its info is not set, e.g. by
+                pyshelly.discover()
+        tags: tags to add to the record
+
+        returns: DeviceRecord
+        '''
+        info = shelly.info or shelly.device_info()
+
+        with self._lock:
+            previous = self._records.get(info.mac)
+            if previous:
+                self._unindex(previous)
+                tags = previous.tags | set(tags)
+                if previous.host != shelly.host:
+                    self._shellies.pop(info.mac, None)
+            record = DeviceRecord(info.mac, shelly.host, info.type, info.fw, time.time(), tags)
+            self._index(record)
+            return record
+
+    def remove(self, mac):
+        '''forget a module
+
+        returns: the removed DeviceRecord
+        '''
+        with self._lock:
+            record = self._records.pop(mac)
+            self._unindex(record)
+            self._shellies.pop(mac, None)
+            return record
+
+    def seen(self, mac):
+        '''mark a module as seen now'''
+        with self._lock:
+            self._records[mac].last_seen = time.time()
+
+    def tag(self, mac, *tags):
+        '''add tags to the record of a module'''
+        with self._lock:
+            record = self._records[mac]
+            self._unindex(record)
+            record.tags = record.tags | set(tags)
+            self._index(record)
+
+    def untag(self, mac, *tags):
+        '''remove tags from the record of a module'''
+        with self._lock:
+            record = self._records[mac]
+            self._unindex(record)
+            record.tags = record.tags - set(tags)
+            self._index(record)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, mac):
+        return mac in self._records
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._records.values()))
+
+    def get(self, mac):
+        '''returns: the DeviceRecord of a module by MAC address, None if unknown'''
+        return self._records.get(mac)
+
+    def by_host(self, host):
+        '''returns: the DeviceRecord of the module last seen at host, None if unknown'''
+        with self._lock:
+            mac = self._hosts.get(host)
+            return self._records.get(mac) if mac else None
+
+    def find(self, tag=None, model=None, relay_state=None, relay_id=0, max_age=None):
+        '''look records up by index, every criterion given must match
+
+        tag: tag string, or iterable of tags which must all be set
+        model: model code, e.g. "SHSW-1"
+        relay_state: shelly.RelayState the relay relay_id is mirrored in - needs self.mirror
+        relay_id: integer id of the relay relay_state applies to
+        max_age: amount of time in seconds after which a mirrored relay state is stale and does
+                 not match relay_state - if not set, the mirror_max_age given to the shelly
+                 objects created, 30 by default
+
+        returns: list of DeviceRecord
+        '''
+        with self._lock:
+            sets = []
+            if tag is not None:
+                for t in [tag] if type(tag) == str else tag:
+                    sets.append(self._tags.get(t, set()))
+            if model is not None:
+                sets.append(self._types.get(model, set()))
+            if relay_state is not None:
+                assert self.mirror is not None, "relay state queries need a mirror"
+                sets.append(self._states.get((relay_id, relay_state), set()))
+
+            macs = set.intersection(*sorted(sets, key=len)) if sets else self._records
+            records = [self._records[mac] for mac in macs]
+
+        if relay_state is not None:
+            # The index holds the last state reported, which may since have gone stale
+            if max_age is None:
+                max_age = self._kwargs.get("mirror_max_age", 30)
+            records = [r for r in records if self.mirror.get(r.host, relay_id, max_age) == relay_state]
+        return records
+
+    def shelly(self, mac):
+        '''get a shelly object for a module, created on first use and then reused
+
+        returns: pyshelly.Shelly1
+        '''
+        with self._lock:
+            s = self._shellies.get(mac)
+            if s is None:
+                record = self._records[mac]
+                kwargs = dict(self._kwargs)
+                if self.mirror is not None:
+                    kwargs.setdefault("mirror", self.mirror)
+                s = self._shellies[mac] = Shelly1(record.host, **kwargs)
+            return s
+
+    def fleet(self, records=None, **kwargs):
+        '''get a fleet of shelly objects, e.g. fleet(registry.find(tag="garden"))
+
+        records: iterable of DeviceRecord or MAC addresses - if not set, every module
+        kwargs: passed on to pyshelly.ShellyFleet
+
+        returns: pyshelly.ShellyFleet
+        '''
+        from .fleet import ShellyFleet
+
+        if records is None:
+            records = list(self)
+        return ShellyFleet([self.shelly(r if type(r) == str else r.mac) for r in records], **kwargs)
+
+    def _index(self, record):
+        # callers hold self._lock
+        self._records[record.mac] = record
+        self._hosts[record.host] = record.mac
+        if record.type:
+            self._types.setdefault(record.type, set()).add(record.mac)
+        for tag in record.tags:
+            self._tags.setdefault(tag, set()).add(record.mac)
+
+        if self.mirror is not None:
+            for relay_id, state in self.mirror.relays(record.host) or ():
+                self._set_state(record.mac, relay_id, state)
+
+    def _unindex(self, record):
+        # callers hold self._lock, the record stays in self._records
+        if self._hosts.get(record.host) == record.mac:
+            del self._hosts[record.host]
+        self._types.get(record.type, set()).discard(record.mac)
+        for tag in record.tags:
+            self._tags.get(tag, set()).discard(record.mac)
+        for macs in self._states.values():
+            macs.discard(record.mac)
+
+    def _set_state(self, mac, relay_id, state):
+        for (other_id, other), macs in self._states.items():
+            if other_id == relay_id and other != state:
+                macs.discard(mac)
+        self._states.setdefault((relay_id, state), set()).add(mac)
+
+    def _relay_changed(self, host, relay_id, state):
+        # mirror subscriber
+        with self._lock:
+            mac = self._hosts.get(host)
+            if mac:
+                self._set_state(mac, relay_id, state)
+
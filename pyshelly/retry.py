@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import random
+import threading
+import time
+
+from .breaker import CircuitOpenError
+from .transport import HTTPStatusError, TransportConnectError, TransportError
+
+
+class RetryPolicy():
+    def __init__(self, attempts=3, backoff=0.05, max_backoff=1.0, budget=10, budget_period=60, seed=None):
+        '''how shelly objects retry requests which failed on the way
+
+        Reads are retried on any transport error but http 4xx; relay writes are retried after
+        reading back the relay in case the failed attempt took effect; toggles are only retried
+        when no connection could be made, since a toggle which reached the module must not be
+        sent twice.
+
+        attempts - maximum number of attempts of a request, the first one included
+        backoff - delay in seconds before the first retry, doubled for each further one
+        max_backoff - maximum delay in seconds before a retry
+        budget - maximum number of retries per host within budget_period, so a device that is
+                 down costs a bounded amount of retries instead of attempts times every call
+        budget_period - amount of time in seconds over which the budget refills
+        seed - seed of the jitter, for reproducible delays
+
+        Each delay is drawn uniformly between 0 and the backoff ("full jitter"), so devices
+        failing together, e.g. on a Wi-Fi outage, do not retry together. A policy may be shared
+        by any number of shelly objects, budgets are kept per host.
+        '''
+        assert type(attempts) == int
+        assert attempts > 0
+        assert budget >= 0
+        assert budget_period > 0
+
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self.budget_period = budget_period
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # host -> (retries left, monotonic time last refilled)
+        self._budgets = {}
+
+    def delay(self, retry):
+        '''returns: amount of time in seconds to wait before retry number retry, from 0'''
+        with self._lock:
+            return self._random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+
+    def spend(self, host):
+        '''take one retry from the budget of host
+
+        returns: False if the budget is exhausted
+        '''
+        now = time.monotonic()
+        with self._lock:
+            left, refilled = self._budgets.get(host, (self.budget, now))
+            left = min(self.budget, left + (now - refilled) * self.budget / self.budget_period)
+            if left < 1:
+                self._budgets[host] = (left, now)
+                return False
+            self._budgets[host] = (left - 1, now)
+            return True
+
+    def remaining(self, host):
+        '''returns: number of whole retries left in the budget of host'''
+        now = time.monotonic()
+        with self._lock:
+            left, refilled = self._budgets.get(host, (self.budget, now))
+        return int(min(self.budget, left + (now - refilled) * self.budget / self.budget_period))
+
+
+def transient(e):
+    '''returns: whether a failed read is worth retrying'''
+    if isinstance(e, CircuitOpenError):
+        return False
+    if isinstance(e, HTTPStatusError):
+        return e.status >= 500
+    return isinstance(e, TransportError)
+
+
+def not_sent(e):
+    '''returns: whether the request certainly never reached the module'''
+    return isinstance(e, TransportConnectError)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+
+class Scheduler():
+    def __init__(self, workers=8):
+        '''run timed jobs for any number of shelly objects on a small pool of threads
+
+        A job is any object with a _step() method. _step() is called on a worker thread once the
+        job is due and returns the monotonic time at which it is due again, or None when the job
+        is finished; if it also has an _abort() method, it is called when cancel() or shutdown()
+        drops the job unfinished. Due times are kept in a heap, so submitting, waking and cancelling a job are
+        O(log n); cancelled entries are dropped lazily when they reach the top of the heap.
+
+        workers - number of worker threads running jobs; a job blocks its worker for the duration
+                  of its requests, so this bounds the number of requests in flight
+        '''
+        assert type(workers) == int
+        assert workers > 0
+
+        self.workers = workers
+
+        # heap of (due, token, job)
+        self._heap = []
+        self._tokens = itertools.count()
+
+        # job -> token of its live heap entry, entries with any other token are stale
+        self._scheduled = {}
+
+        # jobs currently running on a worker, and those of them woken meanwhile
+        self._running = set()
+        self._woken = set()
+
+        self._cond = threading.Condition()
+        self._queue = queue.SimpleQueue()
+        self._threads = []
+        self._shutdown = False
+
+    def submit(self, job, due=None):
+        '''schedule a job
+
+        job: object with a _step() method
+        due: monotonic time at which the job is first run - if not set, now
+
+        returns: job
+        '''
+        with self._cond:
+            if self._shutdown:
+                raise Exception('scheduler is shut down')
+            self._start()
+            self._push(job, time.monotonic() if due is None else due)
+        return job
+
+    def wake(self, job):
+        '''run a scheduled job now instead of at its due time'''
+        with self._cond:
+            if job in self._running:
+                self._woken.add(job)
+            elif job in self._scheduled:
+                self._push(job, time.monotonic())
+
+    def cancel(self, job):
+        '''drop a scheduled job, its _step() is not called again and it is aborted - right away,
+        or once the step it is running returns
+
+        returns: True if the job was scheduled
+        '''
+        with self._cond:
+            self._woken.discard(job)
+            if job in self._running:
+                self._running.discard(job)
+                return True
+            if self._scheduled.pop(job, None) is None:
+                return False
+        _abort(job)
+        return True
+
+    def shutdown(self, wait=True):
+        '''stop the scheduler threads, pending jobs are dropped and aborted'''
+        with self._cond:
+            self._shutdown = True
+            dropped = list(self._scheduled)
+            self._heap = []
+            self._scheduled = {}
+            self._cond.notify_all()
+            threads = self._threads
+        for job in dropped:
+            _abort(job)
+        for _ in range(self.workers):
+            self._queue.put(None)
+        if wait:
+            for t in threads:
+                if t is not threading.current_thread():
+                    t.join()
+
+    def _start(self):
+        if self._threads:
+            return
+        self._threads.append(threading.Thread(target=self._timer, name="pyshelly-timer", daemon=True))
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._worker, name=f"pyshelly-worker-{i}", \
+                daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def _push(self, job, due):
+        token = next(self._tokens)
+        self._scheduled[job] = token
+        heapq.heappush(self._heap, (due, token, job))
+        if self._heap[0][1] == token:
+            self._cond.notify()
+
+    def _timer(self):
+        with self._cond:
+            while not self._shutdown:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                due, token, job = self._heap[0]
+                if self._scheduled.get(job) != token:
+                    heapq.heappop(self._heap)
+                    continue
+
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+
+                heapq.heappop(self._heap)
+                del self._scheduled[job]
+                self._running.add(job)
+                self._queue.put(job)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            try:
+                due = job._step()
+            except Exception:
+                # jobs report their own failures, a broken one is simply dropped
+                due = None
+
+            with self._cond:
+                cancelled = job not in self._running
+                if not cancelled:
+                    self._running.discard(job)
+                woken = job in self._woken
+                self._woken.discard(job)
+                if due is None:
+                    continue
+                if not self._shutdown and not cancelled:
+                    self._push(job, time.monotonic() if woken else due)
+                    continue
+
+            _abort(job)
+
+
+def _abort(job):
+    abort = getattr(job, "_abort", None)
+    if abort is not None:
+        abort()
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+def default_scheduler():
+    '''get the scheduler shared by all shelly objects that were not given one
+
+    returns: pyshelly.scheduler.Scheduler
+    '''
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None or _default_scheduler._shutdown:
+            _default_scheduler = Scheduler()
+        return _default_scheduler
@@ -1,22 +1,60 @@
 #!/usr/bin/env python3
 
-import requests
+import contextlib
 import threading
 import time
 
-from enum import Enum
-from datetime import datetime
+from urllib.parse import urlencode
 
-class RelayState(Enum):
-    ON = True
-    OFF = False
+from .decoding import SelectiveDecoder
+from .models import DeviceInfo, RelayState, Status
+from .oscillation import Oscillation
+from .retry import not_sent, transient
+from .scheduler import default_scheduler
+from .transport import DeadlineExceeded, HTTPStatusError, Timeout, TransportConnectError, TransportError, \
+    TransportTimeout, default_transport_class
 
 class Shelly1():
-    def __init__(self, host=None, http_timeout=1):
+    def __init__(self, host=None, http_timeout=1, transport=None, native_toggle=True, scheduler=None,
+                 status_ttl=None, mirror=None, mirror_max_age=30, metrics=None, status_fields=None,
+                 max_requests=None, retry=None, breaker=None):
         '''shellyone module - https://www.shelly.cloud/en-us/products/product-overview/shelly-1-ul
 
         host - the hostname or IP address of the module - if not set, will default to 192.168.33.1
-        http_timeout - amount of time in seconds an http request will wait to get a response
+        http_timeout - amount of time in seconds an http request will wait to get a response, or
+                       separate connect and read timeouts as a tuple or pyshelly.transport.Timeout,
+                       e.g. (0.3, 2) to give up quickly on unreachable modules but not on slow ones
+        transport - a pyshelly.transport.Transport to issue requests with, or a Transport class
+                    to create one from, e.g. pyshelly.HTTPClientTransport - if not set, a pooled
+                    keep-alive RequestsTransport, or HTTPClientTransport without requests
+                    installed. A transport created here is owned (closed by close()) by this
+                    object; a transport passed in may be shared by several objects and is not
+                    closed.
+        native_toggle - toggle relays with the firmware's turn=toggle in one request - set to False for
+                        firmware lacking it to read the state and then set the opposite one
+        scheduler - a pyshelly.scheduler.Scheduler running non-blocking oscillations - if not set,
+                    the scheduler shared by all shelly objects is used
+        status_ttl - amount of time in seconds a status() response is reused for - if not set,
+                     every call fetches it. Concurrent fetches are coalesced into one request, and
+                     relay writes update the cached copy from their response.
+        mirror - a pyshelly.mirror.StateMirror fed with pushed updates, e.g. by a
+                 pyshelly.coiot.CoIoTListener - relay reads are answered from it without a
+                 request while fresh, and relay writes are recorded in it
+        mirror_max_age - amount of time in seconds after which a mirrored relay state is stale
+        metrics - a pyshelly.metrics.Metrics recording every request, may be shared
+        status_fields - paths of the only fields status() decodes, e.g. ("wifi_sta.rssi",) -
+                        see pyshelly.decoding.SelectiveDecoder. The relay states relay reads use,
+                        relays[*].ison, are always decoded. If not set, the whole response.
+        max_requests - maximum number of requests this object has in flight at the same time,
+                       further ones wait - if not set, only the transport's pool limits them
+        retry - a pyshelly.retry.RetryPolicy for requests failing on the way, may be shared - if
+                not set, a failed request raises at once
+        breaker - a pyshelly.breaker.CircuitBreaker making requests fail fast with
+                  CircuitOpenError while the module does not answer, may be shared
+
+        A Shelly1 may be shared between threads: the status cache, the oscillation handle and
+        counter are locked, and an oscillation started while another one runs raises, however
+        many threads start them at once.
         '''
         if host:
             self.host = host
@@ -27,79 +65,495 @@ class Shelly1():
 
         self.shelly_base_url = f"http://{self.host}"
 
-        # Initialize an oscillation thread name
-        self._oscillation_thread = None
+        self.native_toggle = native_toggle
 
-        # Initialize oscillation thread stop flag
-        self._stop_oscillation = True
+        if transport is None or isinstance(transport, type):
+            self.transport = (transport or default_transport_class())()
+            self._owns_transport = True
+        else:
+            self.transport = transport
+            self._owns_transport = False
+
+        # Guards the oscillation handle and counter
+        self._lock = threading.Lock()
 
         # Initialize an oscillation counter
         self._oscillations = 0
 
-    def status(self):
+        # Handle to the current or last oscillation run (pyshelly.oscillation.Oscillation)
+        self.oscillation = None
+
+        self.scheduler = scheduler
+
+        self.status_ttl = status_ttl
+
+        # Status cache - (monotonic time fetched, status) - and the fetch in flight, if any
+        self._status_lock = threading.Lock()
+        self._status_cache = None
+        self._status_fetch = None
+
+        # Bumped by every relay write, a fetch which started before a write is not cached
+        self._status_generation = 0
+
+        # Number of relays reported by the last status, None until one was fetched
+        self._relay_count = None
+
+        self.mirror = mirror
+        self.mirror_max_age = mirror_max_age
+
+        self.metrics = metrics
+
+        self._request_slots = threading.BoundedSemaphore(max_requests) if max_requests else None
+
+        self.retry = retry
+
+        self.breaker = breaker
+
+        # Per thread: monotonic time the operation in progress must be done by, see _deadline()
+        self._local = threading.local()
+
+        # pyshelly.models.DeviceInfo from the last device_info() call, None until then
+        self.info = None
+
+        self._status_decoder = SelectiveDecoder(*status_fields, "relays[*].ison") if status_fields else None
+
+    def close(self):
+        '''close the transport if it is owned by this object'''
+        if self._owns_transport:
+            self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get(self, path, decoder=None, retryable=transient, verify=None):
+        '''issue a GET request for path against the module, retried under self.retry
+
+        decoder: callable to decode the response with instead of the transport's
+        retryable: predicate taking the TransportError of a failed attempt, whether it may be
+                   retried - by default any but http 4xx
+        verify: callable run before each retry, returning what the request would have if the
+                failed attempt took effect after all, None otherwise
+
+        returns: decoded JSON
+
+        raises: DeadlineExceeded if the deadline of the operation passes first
+        '''
+        retry = 0
+        while True:
+            timeout = self._request_timeout()
+            try:
+                return self._send(path, decoder, timeout)
+            except TransportError as e:
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                if self._cut_short(e, timeout):
+                    raise DeadlineExceeded(f"{self.host}: deadline exceeded waiting for {path}") from e
+                if self.retry is None or retry + 1 >= self.retry.attempts or not retryable(e) or \
+                        not self.retry.spend(self.host):
+                    raise
+                delay = self.retry.delay(retry)
+                remaining = self._remaining()
+                if remaining is not None and delay >= remaining:
+                    raise DeadlineExceeded(f"{self.host}: deadline exceeded retrying {path}") from e
+
+            time.sleep(delay)
+            retry = retry + 1
+
+            if verify is not None:
+                try:
+                    result = verify()
+                except TransportError:
+                    result = None
+                if result is not None:
+                    return result
+
+    def _send(self, path, decoder, timeout):
+        if self.breaker is None:
+            return self._send_slotted(path, decoder, timeout)
+
+        self.breaker.before(self.host)
+        error = None
+        try:
+            return self._send_slotted(path, decoder, timeout)
+        except TransportError as e:
+            error = e
+            raise
+        finally:
+            if self._cut_short(error, timeout):
+                # the caller's deadline tells nothing of the module, which other callers share
+                self.breaker.release(self.host)
+            else:
+                self.breaker.after(self.host, error)
+
+    def _send_slotted(self, path, decoder, timeout):
+        if self._request_slots is None:
+            return self._request(path, decoder, timeout)
+
+        if not self._request_slots.acquire(timeout=self._remaining()):
+            raise DeadlineExceeded(f"{self.host}: deadline exceeded waiting to send {path}")
+        try:
+            return self._request(path, decoder, timeout)
+        finally:
+            self._request_slots.release()
+
+    def _cut_short(self, error, timeout):
+        '''returns: whether a request failed with error because of the deadline of the operation,
+                 rather than because of the module
+        '''
+        if isinstance(error, DeadlineExceeded):
+            return True
+        if timeout is self.http_timeout:
+            return False
+        if isinstance(error, TransportTimeout):
+            # the timeout was cut down to the deadline
+            return True
+        remaining = self._remaining()
+        return isinstance(error, TransportConnectError) and remaining is not None and remaining <= 0
+
+    def _request(self, path, decoder, timeout):
+        # The transport bounds the whole request, response included, to the deadline
+        deadline = getattr(self._local, "deadline", None)
+        if self.metrics is None:
+            return self.transport.get_json(self.shelly_base_url + path, timeout, decoder, deadline)
+
+        start = time.perf_counter()
+        body = None
+        try:
+            if deadline is None:
+                body = self.transport.get(self.shelly_base_url + path, timeout)
+            else:
+                body = self.transport.get(self.shelly_base_url + path, timeout, deadline=deadline)
+            data = self.transport.decode(body, decoder)
+        except Exception as e:
+            self.metrics.record(self.host, path, time.perf_counter() - start, len(body or b""), e)
+            raise
+        self.metrics.record(self.host, path, time.perf_counter() - start, len(body))
+        return data
+
+    @contextlib.contextmanager
+    def _deadline(self, deadline):
+        '''bound the requests made by the calling thread within the block, retries included
+
+        deadline: amount of time in seconds from now - if not set, no bound. Nested deadlines
+                  never extend the outer one.
+        '''
+        if deadline is None:
+            yield
+            return
+
+        outer = getattr(self._local, "deadline", None)
+        until = time.monotonic() + deadline
+        self._local.deadline = until if outer is None else min(outer, until)
+        try:
+            yield
+        finally:
+            self._local.deadline = outer
+
+    def _remaining(self):
+        '''returns: amount of time in seconds left before the deadline, None without one'''
+        until = getattr(self._local, "deadline", None)
+        return None if until is None else until - time.monotonic()
+
+    def _request_timeout(self):
+        '''returns: http_timeout itself, or cut down to the time left before the deadline'''
+        remaining = self._remaining()
+        if remaining is None:
+            return self.http_timeout
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{self.host}: deadline exceeded")
+        timeout = Timeout.of(self.http_timeout)
+        if remaining >= timeout.connect + timeout.read:
+            return self.http_timeout
+        return timeout.capped(remaining)
+
+    def circuit_state(self):
+        '''returns: state of the module's circuit - "closed", "open" or "half-open" - always
+                 "closed" without a breaker
+        '''
+        return self.breaker.state(self.host) if self.breaker is not None else "closed"
+
+    def device_info(self, deadline=None):
+        '''get the model, MAC address and firmware of the module, no authentication needed
+
+        deadline: amount of time in seconds the call may take, retries included
+
+        returns: pyshelly.models.DeviceInfo, also kept as self.info
+        '''
+        if deadline is not None:
+            with self._deadline(deadline):
+                return self.device_info()
+
+        self.info = DeviceInfo.from_json(self._get("/shelly"))
+        return self.info
+
+    def status(self, parsed=False, deadline=None):
         '''get the status of the shelly
 
-        returns: module status as JSON
+        parsed: return a compact pyshelly.models.Status instead of the JSON
+        deadline: amount of time in seconds the call may take, retries included
+
+        returns: module status as JSON - shared with other callers when status_ttl is set, so it
+                 must not be modified - or pyshelly.models.Status if parsed
+        '''
+        if deadline is not None:
+            with self._deadline(deadline):
+                return self.status(parsed)
+
+        if parsed:
+            return Status(self.status())
+
+        if self.status_ttl is None:
+            return self._status_fetched(self._get("/status", self._status_decoder))
+
+        import concurrent.futures
+
+        while True:
+            with self._status_lock:
+                if self._status_cache and time.monotonic() - self._status_cache[0] < self.status_ttl:
+                    return self._status_cache[1]
+
+                fetch = self._status_fetch
+                if fetch is None:
+                    fetch = self._status_fetch = concurrent.futures.Future()
+                    generation = self._status_generation
+                    break
+
+            try:
+                status = fetch.result(self._remaining())
+            except concurrent.futures.TimeoutError as e:
+                raise DeadlineExceeded(f"{self.host}: deadline exceeded waiting for /status") from e
+
+            # None if the fetch ran out of its own deadline, which is not ours - fetch again
+            if status is not None:
+                return status
+
+        try:
+            status = self._status_fetched(self._get("/status", self._status_decoder))
+        except BaseException as e:
+            with self._status_lock:
+                self._status_fetch = None
+            if isinstance(e, DeadlineExceeded):
+                fetch.set_result(None)
+            else:
+                fetch.set_exception(e)
+            raise
+
+        with self._status_lock:
+            self._status_fetch = None
+            if generation == self._status_generation:
+                self._status_cache = (time.monotonic(), status)
+        fetch.set_result(status)
+        return status
+
+    def _status_fetched(self, status):
+        # Remember how many relays the module has to pick the smallest endpoint for reads
+        if 'relays' in status:
+            self._relay_count = len(status['relays'])
+        return status
+
+    def invalidate_status(self):
+        '''drop the cached status, the next status() call fetches it'''
+        with self._status_lock:
+            self._status_cache = None
+            self._status_generation = self._status_generation + 1
+
+    def _fresh_status(self):
+        '''returns: the cached status if it is fresh, None otherwise - never fetches'''
+        if self.status_ttl is None:
+            return None
+        with self._status_lock:
+            if self._status_cache and time.monotonic() - self._status_cache[0] < self.status_ttl:
+                return self._status_cache[1]
+        return None
+
+    def _write_relay(self, relay_id, turn):
+        '''switch a relay
+
+        turn: "on", "off" or "toggle"
+
+        returns: shelly.RelayState
+        '''
+        path = f"/relay/{relay_id}?turn={turn}"
+        if turn == "toggle":
+            # A toggle which reached the module must not be repeated
+            relay = self._get(path, retryable=not_sent)
+        else:
+            relay = self._get(path, verify=lambda: self._verify_relay(relay_id, turn == "on"))
+        return self._relay_seen(relay_id, relay)
+
+    def _verify_relay(self, relay_id, ison):
+        '''returns: the /relay/{id} response if the relay is in state ison, None otherwise'''
+        relay = self._send(f"/relay/{relay_id}", None, self._request_timeout())
+        return relay if relay['ison'] == ison else None
+
+    def _relay_seen(self, relay_id, relay):
+        '''update the cached status and the mirror from a /relay/{id} response
+
+        returns: shelly.RelayState
         '''
-        return requests.get(self.shelly_base_url + "/status", timeout=self.http_timeout).json()
+        if self.status_ttl is not None:
+            with self._status_lock:
+                self._status_generation = self._status_generation + 1
+                if self._status_cache:
+                    fetched, status = self._status_cache
+                    relays = list(status.get('relays', ()))
+                    if relay_id < len(relays):
+                        # Copy on write, callers may still hold the previous status
+                        relays[relay_id] = dict(relays[relay_id], **relay)
+                        self._status_cache = (fetched, dict(status, relays=relays))
+
+        state = RelayState.ON if relay['ison'] else RelayState.OFF
 
-    def get_relays(self):
+        if self.mirror is not None:
+            self.mirror.update(self.host, relay_id, state)
+
+        return state
+
+    def get_relays(self, deadline=None):
         '''get a list of relays supported by the module
 
+        deadline: amount of time in seconds the call may take, retries included
+
         returns: list of tuples - (id, shelly.RelayState)
         '''
-        s = self.status()['relays']
-        relays = []
-        for i in range(len(s)):
-            relays.append((i, RelayState.ON if s[i]['ison'] else RelayState.OFF))
-        return relays
+        if deadline is not None:
+            with self._deadline(deadline):
+                return self.get_relays()
 
-    def get_relay_state(self, relay_id):
+        # Relay writes and reads record single relays in the mirror, it only answers for all of
+        # them once the number of relays is known
+        if self.mirror is not None and self._relay_count is not None:
+            relays = self.mirror.relays(self.host, self.mirror_max_age, self._relay_count)
+            if relays is not None:
+                return relays
+
+        # With a single relay, /relay/0 is an order of magnitude smaller than /status
+        if self._relay_count == 1 and self._fresh_status() is None:
+            return [(0, self._relay_seen(0, self._get("/relay/0")))]
+
+        return [(r.id, r.state) for r in self.status(parsed=True).relays]
+
+    def get_relay_state(self, relay_id, deadline=None):
         '''get the status of a relay by id
 
         relay_id: integer id of the relay
+        deadline: amount of time in seconds the call may take, retries included
 
         returns: shelly.RelayState
         '''
         assert type(relay_id) == int
 
-        return RelayState.ON if self.status()['relays'][relay_id]['ison'] else RelayState.OFF
+        if deadline is not None:
+            with self._deadline(deadline):
+                return self.get_relay_state(relay_id)
+
+        if self.mirror is not None:
+            state = self.mirror.get(self.host, relay_id, self.mirror_max_age)
+            if state is not None:
+                return state
+
+        status = self._fresh_status()
+        if status is not None:
+            return Status(status).relays[relay_id].state
+
+        return self._relay_seen(relay_id, self._get(f"/relay/{relay_id}"))
 
-    def power(self, relay_id, state):
+    def get_meter(self, meter_id, deadline=None):
+        '''get the readings of a power meter by id
+
+        meter_id: integer id of the meter
+        deadline: amount of time in seconds the call may take, retries included
+
+        returns: meter status as JSON - power, total, counters...
+        '''
+        assert type(meter_id) == int
+
+        if deadline is not None:
+            with self._deadline(deadline):
+                return self.get_meter(meter_id)
+
+        return self._get(f"/meter/{meter_id}")
+
+    def power(self, relay_id, state, deadline=None):
         '''set the power state of the relay
 
         relay_id: relay to set power state
         state (bool): True == on; False == off
+        deadline: amount of time in seconds the call may take, retries and read-backs included
 
         returns: shelly.RelayState
         '''
         assert type(relay_id) == int
         assert type(state) == bool
 
+        if deadline is not None:
+            with self._deadline(deadline):
+                return self.power(relay_id, state)
+
         url_state = "off"
         if state:
             url_state = "on"
 
-        if requests.get(self.shelly_base_url + f"/relay/{relay_id}?turn={url_state}", timeout=self.http_timeout).json()['ison']:
-            return RelayState.ON
-        else:
-            return RelayState.OFF
-
+        return self._write_relay(relay_id, url_state)
 
-    def toggle(self, relay_id):
+    def toggle(self, relay_id, native=None, deadline=None):
         '''toggle the state of the relay
 
         relay_id: relay to toggle
+        native: whether to use the firmware's turn=toggle (one request) or to read the state and
+                set the opposite one (two requests) - if not set, uses self.native_toggle
+        deadline: amount of time in seconds the call may take, both requests of a non-native
+                  toggle and retries included
 
         returns: shelly.RelayState
         '''
         assert type(relay_id) == int
+        assert native is None or type(native) == bool
+
+        if deadline is not None:
+            with self._deadline(deadline):
+                return self.toggle(relay_id, native)
+
+        if native is None:
+            native = self.native_toggle
+
+        if native:
+            return self._write_relay(relay_id, "toggle")
 
         if self.get_relay_state(relay_id) == RelayState.ON:
             return self.power(relay_id, False)
         else:
             return self.power(relay_id, True)
 
+    def set_action_url(self, relay_id, action, url):
+        '''set the url the module calls on an event
+
+        relay_id: relay (channel) the action belongs to
+        action: Gen1 action name, e.g. "out_on_url", "btn_on_url", "longpush_url"
+        url: url to call - if None, the action is disabled
+
+        returns: module response as JSON
+        '''
+        assert type(relay_id) == int
+        assert type(action) == str
+
+        if url is None:
+            query = urlencode({"index": relay_id, "name": action, "enabled": "false"})
+        else:
+            query = urlencode({"index": relay_id, "name": action, "enabled": "true", "urls[]": url})
+
+        try:
+            return self._get("/settings/actions?" + query)
+        except HTTPStatusError as e:
+            if e.status != 404:
+                raise
+
+        # Firmware before 1.8 keeps action urls in the relay settings
+        return self._get(f"/settings/relay/{relay_id}?" + urlencode({action: url or ""}))
+
     def oscillate(self, relay_id, period, block=True):
         '''oscillate between on and off
 
@@ -107,45 +561,35 @@ class Shelly1():
         period: length of time in seconds in each power state, on and off, during oscillation
         block: whether or not this function will block
 
-        returns: nothing if block==True, otherwise a handle to threading.Thread
+        returns: pyshelly.oscillation.Oscillation - if block==False, a handle to the run on the
+                 scheduler which can be cancelled or joined
         '''
         assert type(relay_id) == int
         assert type(period) in (int, float)
         assert period >= 0.05
         assert type(block) == bool
 
-        # test for re-entry
-        if self._oscillation_thread and self._oscillation_thread.is_alive():
-            raise Exception('oscillation in progress')
-
-        if block:
-            # Reset initial state of the flag
-            self._stop_oscillation = False
-
-            self._oscillations = 0
-            while not self._stop_oscillation:
-                self.toggle(relay_id)
-
-                # TODO: thread safety?
-                self._oscillations = self._oscillations + 1
+        def _edge():
+            self.toggle(relay_id)
+            self._count_edge(1)
 
-                time.sleep(period)
-        else:
-            # "background" as a thread
-            t = threading.Thread(target=self.oscillate, args=(relay_id, period,), daemon=True)
-            t.start()
-            self._oscillation_thread = t
+        return self._start_oscillation(Oscillation(period, edge=_edge), block)
 
-    def oscillate_timeout(self, relay_id, period, timeout, block=True, start_state=True, final_state=False):
+    def oscillate_timeout(self, relay_id, period, timeout, block=True, start_state=True, final_state=False,
+                          final_deadline=None):
         '''oscillate until timeout has elapsed
 
         relay_id: id of the relay to oscillate
         period: length of time in seconds in each power state, on and off, during oscillation
         timeout: amount of time in seconds after which oscillation halts
         block: whether or not this function will block
+        start_state: initial state of relay
         final_state: state of the relay when oscillation halts (type RelayState)
+        final_deadline: amount of time in seconds setting the final state may take, its read,
+                        write and retries included - if not set, no bound
 
-        returns: nothing if block==True, otherwise a handle to threading.Thread
+        returns: pyshelly.oscillation.Oscillation - if block==False, a handle to the run on the
+                 scheduler which can be cancelled or joined
         '''
         assert type(relay_id) == int
         assert type(period) in (int, float)
@@ -153,44 +597,23 @@ class Shelly1():
         assert type(timeout) == int
         assert timeout > 0
         assert type(block) == bool
+        assert type(start_state) == bool
         assert type(final_state) == bool
+        assert final_deadline is None or type(final_deadline) in (int, float)
 
-        def _stop_oscillation_in(period, timeout, final_state):
-
-            # Reset initial state of the flag
-            self._stop_oscillation = False
-
-            current_epoch = datetime.now().timestamp()
-            while datetime.now().timestamp() < (current_epoch + timeout):
-                time.sleep(0.1)
-
-            self._stop_oscillation = True
-
-            # Sleep for 1x period duration to ensure that the oscillation thread has had time to
-            # finish setting its final state and exit. Without this sleep, it is possible that we
-            # encounter a race condition whereby the read (get_relay_state) happens before the last
-            # alteration of the state by the oscillation thread...which is a dirty read, not good.
-            time.sleep(period)
-
-            if self.get_relay_state(relay_id).value != final_state:
-                self.power(relay_id, final_state)
-
-        # Set starting state
-        if self.get_relay_state(relay_id).value != start_state:
-            self.power(relay_id, start_state)
-            time.sleep(period)
-
-        self.oscillate(relay_id, period, block=False)
-
-        # Background the stop thread
-        t = threading.Thread(target=_stop_oscillation_in, args=(period, timeout,), \
-            kwargs={"start_state": start_state, "final_state": final_state}, daemon=True)
-        t.start()
+        def _edge():
+            self.toggle(relay_id)
+            self._count_edge(1)
 
-        if block:
-            self._oscillation_thread.join()
+        # The timeout runs from the first edge; no edge is started at or after it, and the last
+        # state is held until the edge deadline that would have followed it. The final state is
+        # written by the same step sequence right after, so its read is never dirty.
+        return self._start_oscillation(Oscillation(period, edge=_edge, timeout=timeout, \
+            setup=lambda: self._set_start_state(relay_id, start_state, period), \
+            finish=lambda: self._set_final_state(relay_id, final_state, final_deadline)), block)
 
-    def oscillate_cycles(self, relay_id, period, cycles, block=True, start_state=True, final_state=False):
+    def oscillate_cycles(self, relay_id, period, cycles, block=True, start_state=True, final_state=False,
+                         final_deadline=None):
         '''oscillate a specific cycle count
 
         relay_id: id of the relay to oscillate
@@ -199,8 +622,11 @@ class Shelly1():
         block: whether or not this function will block
         start_state: initial state of relay
         final_state: state of the relay when oscillation halts (type RelayState)
+        final_deadline: amount of time in seconds setting the final state may take, its read,
+                        write and retries included - if not set, no bound
 
-        returns: nothing if block==True, otherwise a handle to threading.Thread
+        returns: pyshelly.oscillation.Oscillation - if block==False, a handle to the run on the
+                 scheduler which can be cancelled or joined
 
         NOTE: Count is NOT incremented by change of state TO the start_state. Counting begins only
         after the initial start state is realized.
@@ -213,41 +639,59 @@ class Shelly1():
         assert type(block) == bool
         assert type(start_state) == bool
         assert type(final_state) == bool
+        assert final_deadline is None or type(final_deadline) in (int, float)
 
-        # test for re-entry
-        if self._oscillation_thread and self._oscillation_thread.is_alive():
-            raise Exception('oscillation in progress')
+        def _edge():
+            self.toggle(relay_id)
 
-        if block:
-            # Reset initial state of the flag
-            self._stop_oscillation = False
+            # One toggle is half a cycle
+            self._count_edge(0.5)
 
-            # Set starting state
-            if self.get_relay_state(relay_id).value != start_state:
-                self.power(relay_id, start_state)
-                time.sleep(period)
+        return self._start_oscillation(Oscillation(period, edge=_edge, edges=2 * cycles, \
+            setup=lambda: self._set_start_state(relay_id, start_state, period), \
+            finish=lambda: self._set_final_state(relay_id, final_state, final_deadline)), block)
 
-            # Reset the initial count of oscillations
+    def _start_oscillation(self, oscillation, block):
+        # The re-entry test and the claim are one step, so two threads cannot both pass the test
+        with self._lock:
+            if self.oscillation and self.oscillation.running():
+                raise Exception('oscillation in progress')
+            self.oscillation = oscillation
             self._oscillations = 0
 
-            while not self._stop_oscillation and self._oscillations < cycles:
-                self.toggle(relay_id)
-
-                time.sleep(period)
-
-                # TODO: thread safety?
-                # One toggle is half a cycle
-                self._oscillations = self._oscillations + 0.5
+        if block:
+            oscillation.run()
+        else:
+            try:
+                oscillation.schedule(self.scheduler or default_scheduler())
+            except BaseException:
+                # Never started, it must not keep holding the claim
+                oscillation._abort()
+                raise
+        return oscillation
+
+    def _set_start_state(self, relay_id, start_state, period):
+        '''set the starting state of an oscillation
+
+        returns: monotonic time of the first edge - one period after the state changed, None if
+                 the relay was already in start_state
+        '''
+        if self.get_relay_state(relay_id).value != start_state:
+            self.power(relay_id, start_state)
+            return time.monotonic() + period
 
+    def _set_final_state(self, relay_id, final_state, deadline=None):
+        with self._deadline(deadline):
             if self.get_relay_state(relay_id).value != final_state:
                 self.power(relay_id, final_state)
-        else:
-            # "background" as a thread
-            t = threading.Thread(target=self.oscillate_cycles, args=(relay_id, period, cycles,), \
-                kwargs={"start_state": start_state, "final_state": final_state}, daemon=True)
-            t.start()
-            self._oscillation_thread = t
+
+    def _count_edge(self, increment):
+        with self._lock:
+            self._oscillations = self._oscillations + increment
 
     def stop_oscillation(self):
         '''stop an oscillation operation'''
-        self._stop_oscillation = True
+        with self._lock:
+            oscillation = self.oscillation
+        if oscillation:
+            oscillation.cancel()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+
+import importlib.util
+import io
+import json
+import socket
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+from .decoding import default_decoder
+
+
+class TransportError(Exception):
+    '''raised when an http request to a shelly module fails'''
+
+
+class TransportTimeout(TransportError):
+    '''raised when an http request to a shelly module times out'''
+
+
+class DeadlineExceeded(TransportTimeout):
+    '''raised when an operation on a shelly module runs out of its deadline'''
+
+
+class TransportConnectError(TransportError):
+    '''raised when no connection to a shelly module could be made, the request was not sent'''
+
+
+class HTTPStatusError(TransportError):
+    '''raised when a shelly module answers with an http error status'''
+    def __init__(self, url, status):
+        super().__init__(f"{url} returned http status {status}")
+        self.url = url
+        self.status = status
+
+
+class Timeout():
+    __slots__ = ("connect", "read")
+
+    def __init__(self, connect, read):
+        '''separate connect and read timeouts of a request
+
+        connect - amount of time in seconds to wait for a connection to the module
+        read - amount of time in seconds to wait for each read of the response once connected
+        '''
+        self.connect = connect
+        self.read = read
+
+    @classmethod
+    def of(cls, timeout):
+        '''returns: timeout as a Timeout - a number applies to both, a tuple is (connect, read)'''
+        if isinstance(timeout, cls):
+            return timeout
+        if type(timeout) == tuple:
+            return cls(*timeout)
+        return cls(timeout, timeout)
+
+    def capped(self, limit):
+        '''returns: a Timeout with neither timeout above limit seconds'''
+        return Timeout(min(self.connect, limit), min(self.read, limit))
+
+    def __repr__(self):
+        return f"Timeout(connect={self.connect}, read={self.read})"
+
+
+class Transport():
+    '''base class for the http transports used by shelly modules
+
+    A transport owns the network connections and may be shared by any number of shelly
+    objects, across any number of hosts. Subclasses implement get().
+    '''
+    # callable decoding a response body, see pyshelly.decoding
+    decoder = staticmethod(json.loads)
+
+    def get(self, url, timeout, deadline=None):
+        '''issue a GET request
+
+        url: absolute url of the request
+        timeout: amount of time in seconds the request will wait to get a response, or
+                 separate connect and read timeouts as a tuple or Timeout
+        deadline: monotonic time the whole request, response included, must be done by - if
+                  not set, only timeout bounds it
+
+        returns: the response body as bytes
+
+        raises: DeadlineExceeded once the deadline has passed
+        '''
+        raise NotImplementedError
+
+    def decode(self, body, decoder=None):
+        '''decode a response body
+
+        decoder: callable to decode body with instead of self.decoder
+
+        returns: decoded JSON
+        '''
+        return (decoder or self.decoder)(body)
+
+    def get_json(self, url, timeout, decoder=None, deadline=None):
+        '''issue a GET request and decode the JSON response
+
+        decoder: callable to decode the response with instead of self.decoder
+        deadline: monotonic time the request must be done by, see get()
+
+        returns: decoded JSON
+        '''
+        if deadline is None:
+            return self.decode(self.get(url, timeout), decoder)
+        return self.decode(self.get(url, timeout, deadline=deadline), decoder)
+
+    def close(self):
+        '''close all connections held by the transport'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RequestsTransport(Transport):
+    def __init__(self, pool_connections=256, pool_maxsize=2, pool_block=True, decoder=None):
+        '''keep-alive transport built on a requests.Session
+
+        requests is imported here, not with the package, see HTTPClientTransport to do without.
+
+        pool_connections - number of hosts for which connection pools are kept - past it, the
+                           least recently used pool is dropped with its connections, so it must
+                           be at least the number of modules sharing the transport or they
+                           reconnect on nearly every request
+        pool_maxsize - maximum number of connections kept open per host
+        pool_block - if True, never open more than pool_maxsize connections to a host and wait
+                     for a free one instead; Gen1 modules only have a handful of sockets
+        decoder - callable decoding response bodies - if not set, the fastest JSON library
+                  installed (see pyshelly.decoding.default_decoder)
+        '''
+        import requests
+
+        self.decoder = decoder or default_decoder()
+
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, \
+            pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def get(self, url, timeout, deadline=None):
+        import requests
+
+        if self._closed:
+            raise TransportError('transport is closed')
+
+        timeout = Timeout.of(timeout)
+        try:
+            if deadline is None:
+                r = self._session.get(url, timeout=(timeout.connect, timeout.read))
+                content = r.content
+            else:
+                # Both timeouts are cut down to the time left, and the deadline is checked after
+                # each read of the body; unlike HTTPClientTransport, requests gives no hold on
+                # each read of the headers
+                r = self._session.get(url, timeout=(_bound(timeout.connect, deadline), \
+                    _bound(timeout.read, deadline)), stream=True)
+                with r:
+                    chunks = []
+                    for chunk in r.iter_content(8192):
+                        chunks.append(chunk)
+                        if _passed(deadline):
+                            raise DeadlineExceeded("deadline exceeded")
+                    content = b"".join(chunks)
+        except DeadlineExceeded as e:
+            raise DeadlineExceeded(f"{url}: {e}") from e.__cause__
+        except requests.exceptions.ConnectTimeout as e:
+            if _passed(deadline):
+                raise DeadlineExceeded(f"{url}: deadline exceeded") from e
+            raise TransportConnectError(str(e)) from e
+        except requests.exceptions.Timeout as e:
+            if _passed(deadline):
+                raise DeadlineExceeded(f"{url}: deadline exceeded") from e
+            raise TransportConnectError(str(e)) from e
+        except requests.exceptions.Timeout as e:
+            raise TransportTimeout(str(e)) from e
+        except requests.exceptions.ConnectionError as e:
+            # urllib3 wraps the failure to connect, as opposed to a connection lost mid-request
+            import urllib3
+            if isinstance(getattr(e.args[0] if e.args else None, "reason", None), \
+                    urllib3.exceptions.NewConnectionError):
+                raise TransportConnectError(str(e)) from e
+            raise TransportError(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            raise TransportError(str(e)) from e
+
+        if r.status_code >= 400:
+            raise HTTPStatusError(url, r.status_code)
+
+        return content
+
+    def close(self):
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._session.close()
+
+
+class HTTPClientTransport(Transport):
+    # errors of a kept-alive connection the module closed while it was idle, set once http.client
+    # is imported by the first instance
+    _STALE = None
+
+    def __init__(self, pool_maxsize=2, decoder=None):
+        '''keep-alive transport built on the standard library's http.client, no dependencies
+
+        pool_maxsize - maximum number of connections opened to a single host, further requests
+                       wait for a free one; Gen1 modules only have a handful of sockets
+        decoder - callable decoding response bodies - if not set, the fastest JSON library
+                  installed (see pyshelly.decoding.default_decoder)
+        '''
+        import http.client
+
+        assert type(pool_maxsize) == int
+        assert pool_maxsize > 0
+
+        if HTTPClientTransport._STALE is None:
+            HTTPClientTransport._STALE = (http.client.RemoteDisconnected, http.client.BadStatusLine, \
+                ConnectionResetError, BrokenPipeError)
+
+        self.pool_maxsize = pool_maxsize
+        self.decoder = decoder or default_decoder()
+
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # (host, port) -> list of idle http.client.HTTPConnection
+        self._idle = {}
+
+        # (host, port) -> threading.BoundedSemaphore bounding connections to that host
+        self._semaphores = {}
+
+    def get(self, url, timeout, deadline=None):
+        import http.client
+
+        if self._closed:
+            raise TransportError('transport is closed')
+
+        u = urlsplit(url)
+        key = (u.hostname, u.port or 80)
+        target = u.path or "/"
+        if u.query:
+            target = target + "?" + u.query
+
+        with self._lock:
+            sem = self._semaphores.get(key)
+            if sem is None:
+                sem = self._semaphores[key] = threading.BoundedSemaphore(self.pool_maxsize)
+
+        timeout = Timeout.of(timeout)
+        if not sem.acquire(timeout=None if deadline is None else max(deadline - time.monotonic(), 0)):
+            raise DeadlineExceeded(f"{url}: deadline exceeded waiting for a connection")
+        try:
+            status, body = self._request(key, target, timeout, deadline)
+        except TransportConnectError as e:
+            raise TransportConnectError(f"{url}: {e}") from e.__cause__
+        except DeadlineExceeded as e:
+            raise DeadlineExceeded(f"{url}: {e}") from e.__cause__
+        except socket.timeout as e:
+            if _passed(deadline):
+                raise DeadlineExceeded(f"{url}: deadline exceeded") from e
+            raise TransportTimeout(f"{url} timed out after {timeout.read} seconds") from e
+        except (OSError, http.client.HTTPException) as e:
+            raise TransportError(f"{url}: {e}") from e
+        finally:
+            sem.release()
+
+        if status >= 400:
+            raise HTTPStatusError(url, status)
+
+        return body
+
+    def _request(self, key, target, timeout, deadline):
+        import http.client
+
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                break
+
+            try:
+                self._send(conn, target, timeout, deadline)
+            except self._STALE:
+                # the module dropped an idle keep-alive connection before the request went out
+                conn.close()
+                continue
+            except BaseException:
+                conn.close()
+                raise
+
+            try:
+                return self._response(key, conn)
+            except self._STALE:
+                # the module dropped the connection, maybe after acting on the request - only a
+                # request without effects is sent again, a write fails and is left to the caller
+                if writes(target):
+                    raise
+
+        conn = http.client.HTTPConnection(key[0], key[1], timeout=_bound(timeout.connect, deadline))
+        try:
+            conn.connect()
+        except OSError as e:
+            conn.close()
+            if _passed(deadline):
+                raise DeadlineExceeded("deadline exceeded connecting") from e
+            raise TransportConnectError(str(e)) from e
+
+        try:
+            self._send(conn, target, timeout, deadline)
+        except BaseException:
+            conn.close()
+            raise
+        return self._response(key, conn)
+
+    def _send(self, conn, target, timeout, deadline):
+        import http.client
+
+        conn.sock.settimeout(_bound(timeout.read, deadline))
+        if deadline is None:
+            conn.response_class = http.client.HTTPResponse
+        else:
+            # every read of the response is bounded by the time left
+            conn.response_class = lambda sock, *args, **kwargs: \
+                http.client.HTTPResponse(_DeadlineSocket(sock, timeout.read, deadline), *args, **kwargs)
+        conn.request("GET", target, headers={"Accept": "application/json"})
+
+    def _response(self, key, conn):
+        try:
+            response = conn.getresponse()
+            body = response.read()
+        except BaseException:
+            conn.close()
+            raise
+
+        with self._lock:
+            if response.will_close or self._closed:
+                conn.close()
+            else:
+                self._idle.setdefault(key, []).append(conn)
+
+        return response.status, body
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class _DeadlineSocket():
+    def __init__(self, sock, read, deadline):
+        '''what http.client.HTTPResponse uses of a socket, reading it with each read bounded by
+        the read timeout and all of them by a deadline
+        '''
+        self._sock = sock
+        self._read = read
+        self._deadline = deadline
+
+    def makefile(self, mode):
+        return io.BufferedReader(_DeadlineReader(self._sock, self._read, self._deadline))
+
+
+class _DeadlineReader(io.RawIOBase):
+    def __init__(self, sock, read, deadline):
+        self._sock = sock
+        self._read = read
+        self._deadline = deadline
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        self._sock.settimeout(_bound(self._read, self._deadline))
+        return self._sock.recv_into(b)
+
+
+def _passed(deadline):
+    '''returns: whether the monotonic deadline, if any, has passed'''
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def _bound(seconds, deadline):
+    '''returns: seconds, cut down to the time left before the monotonic deadline, if any
+
+    raises: DeadlineExceeded if no time is left
+    '''
+    if deadline is None:
+        return seconds
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("deadline exceeded")
+    return min(seconds, left)
+
+
+def writes(target):
+    '''returns: whether a request target switches something, so must not be sent twice'''
+    return "turn=" in target.partition("?")[2]
+
+
+def default_transport_class():
+    '''returns: RequestsTransport if requests is installed, HTTPClientTransport otherwise'''
+    return RequestsTransport if importlib.util.find_spec("requests") else HTTPClientTransport
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import socket
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+from .mirror import StateMirror
+from .models import RelayState
+
+# Gen1 action names by the event they report, as accepted by /settings/actions
+ACTIONS = {
+    "out_on": "out_on_url",
+    "out_off": "out_off_url",
+    "btn_on": "btn_on_url",
+    "btn_off": "btn_off_url",
+    "shortpush": "shortpush_url",
+    "longpush": "longpush_url",
+}
+
+# Events reporting the relay output itself
+_OUTPUT_EVENTS = {
+    "out_on": RelayState.ON,
+    "out_off": RelayState.OFF,
+}
+
+
+class ActionReceiver():
+    def __init__(self, mirror=None, address="0.0.0.0", port=0, advertised_host=None):
+        '''receive the action url calls Gen1 modules make on relay and button events
+
+        mirror - pyshelly.mirror.StateMirror to record relay output events in - if not set, one
+                 is created
+        address - local address to listen on
+        port - local TCP port to listen on - if 0, any free port
+        advertised_host - host name or address the modules reach this receiver at - if not set,
+                          the address of the interface routing to each registered module
+
+        Modules call GET /pyshelly/<host>/<relay id>/<event>, where event is one of ACTIONS.
+        '''
+        self.mirror = mirror if mirror is not None else StateMirror()
+        self.address = address
+        self.port = port
+        self.advertised_host = advertised_host
+
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        '''start listening on a background thread
+
+        returns: self
+        '''
+        if self._server:
+            raise Exception('receiver already running')
+
+        receiver = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                code = 200 if receiver._dispatch(self.path) else 404
+                self.send_response(code)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.address, self.port), _Handler)
+        self._server.daemon_threads = True
+
+        # The port actually bound, in case port 0 was asked for
+        self.port = self._server.server_address[1]
+
+        self._thread = threading.Thread(target=self._server.serve_forever, name="pyshelly-actions", \
+            daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''stop listening'''
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def subscribe(self, callback):
+        '''call callback(host, relay_id, event) for every event received
+
+        Called on the receiving thread, so it should return quickly.
+        '''
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def url(self, host, relay_id, event, advertised_host=None):
+        '''get the action url a module calls for an event
+
+        host: host of the module, as used for pyshelly.Shelly1(host)
+        relay_id: integer id of the relay
+        event: one of ACTIONS
+        advertised_host: overrides self.advertised_host
+
+        returns: url string
+        '''
+        assert type(relay_id) == int
+        assert event in ACTIONS
+
+        advertised_host = advertised_host or self.advertised_host or self._local_address(host)
+        return f"http://{advertised_host}:{self.port}/pyshelly/{quote(host, safe='')}/{relay_id}/{event}"
+
+    def register(self, shelly, relay_id, events=("out_on", "out_off")):
+        '''point a module's action urls for a relay at this receiver
+
+        shelly: pyshelly.Shelly1
+        relay_id: integer id of the relay
+        events: events to register, from ACTIONS
+        '''
+        for event in events:
+            shelly.set_action_url(relay_id, ACTIONS[event], self.url(shelly.host, relay_id, event))
+
+    def unregister(self, shelly, relay_id, events=("out_on", "out_off")):
+        '''disable a module's action urls for a relay'''
+        for event in events:
+            shelly.set_action_url(relay_id, ACTIONS[event], None)
+
+    def _local_address(self, host):
+        # The source address the kernel would use to reach host; UDP connect sends nothing
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect((host.rsplit(":", 1)[0], 80))
+            return s.getsockname()[0]
+
+    def _dispatch(self, path):
+        '''handle a request path
+
+        returns: True if path was an action url
+        '''
+        parts = path.split("?", 1)[0].strip("/").split("/")
+        if len(parts) != 4 or parts[0] != "pyshelly" or parts[3] not in ACTIONS:
+            return False
+        try:
+            relay_id = int(parts[2])
+        except ValueError:
+            return False
+
+        host, event = unquote(parts[1]), parts[3]
+
+        if event in _OUTPUT_EVENTS:
+            self.mirror.update(host, relay_id, _OUTPUT_EVENTS[event])
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(host, relay_id, event)
+
+        return True